@@ -0,0 +1,160 @@
+import argparse
+import random
+import statistics
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import BitMinesweeper, BitMinesweeperAI
+from minesweeper import Minesweeper, MinesweeperAI
+
+# Standard board sizes: (height, width, mines)
+BOARDS = {
+    "beginner": (9, 9, 10),
+    "intermediate": (16, 16, 40),
+    "expert": (16, 30, 99),
+    "stress": (1000, 1000, 100000)
+}
+
+# Board sizes played when none are given
+DEFAULT_BOARDS = ["beginner", "intermediate", "expert"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Play seeded Minesweeper games headlessly with the AI."
+    )
+    parser.add_argument("boards", nargs="*", default=DEFAULT_BOARDS,
+                        help=f"board sizes to play, from {', '.join(BOARDS)}")
+    parser.add_argument("-n", "--games", type=int, default=100,
+                        help="games per board size")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="seed of the first game")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--bitset", action="store_true",
+                        help="use the bitmask board and AI")
+    args = parser.parse_args()
+    for board in args.boards:
+        if board not in BOARDS:
+            parser.error(f"unknown board size {board!r}")
+
+    for board in args.boards:
+        height, width, mines = BOARDS[board]
+        results = run_games(height, width, mines, args.games,
+                            args.seed, args.processes, args.bitset)
+        report(board, summarize(results))
+
+
+def play_game(height, width, mines, seed, bitset=False):
+    """
+    Plays one game with MinesweeperAI, or BitMinesweeperAI on a
+    BitMinesweeper board if `bitset`, seeding the random module with
+    `seed` so the board and the AI's guesses can be reproduced.
+
+    Returns a dict with whether the game was won, the number of moves,
+    the time taken by the AI for each move and the largest knowledge base.
+    """
+    random.seed(seed)
+    if bitset:
+        game = BitMinesweeper(height=height, width=width, mines=mines)
+        ai = BitMinesweeperAI(height=height, width=width, mines=mines)
+    else:
+        game = Minesweeper(height=height, width=width, mines=mines)
+        ai = MinesweeperAI(height=height, width=width, mines=mines)
+
+    revealed = 0
+    latencies = []
+    peak_knowledge = 0
+    won = False
+    while True:
+
+        # Time the AI choosing a move
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+        elapsed = time.perf_counter() - start
+        if move is None:
+            won = ai.mines == game.mines
+            break
+        if game.is_mine(move):
+            latencies.append(elapsed)
+            break
+
+        # Time the AI taking in what the move revealed
+        nearby = game.nearby_mines(move)
+        start = time.perf_counter()
+        ai.add_knowledge(move, nearby)
+        latencies.append(elapsed + time.perf_counter() - start)
+        peak_knowledge = max(peak_knowledge, len(ai.knowledge))
+
+        # Game is won once every safe cell has been revealed
+        revealed += 1
+        if revealed == height * width - mines:
+            won = True
+            break
+
+    return {
+        "won": won,
+        "moves": len(latencies),
+        "latencies": latencies,
+        "peak_knowledge": peak_knowledge
+    }
+
+
+def run_games(height, width, mines, games, seed=0, processes=None,
+              bitset=False):
+    """
+    Plays `games` games with seeds seed, seed + 1, ... in a process pool,
+    returning the list of results from play_game.
+    """
+    seeds = range(seed, seed + games)
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(
+            play_game, [height] * games, [width] * games, [mines] * games,
+            seeds, [bitset] * games, chunksize=max(1, games // 32)
+        ))
+
+
+def summarize(results):
+    """Aggregates play_game results into benchmark statistics."""
+    latencies = sorted(
+        latency for result in results for latency in result["latencies"]
+    )
+    moves = len(latencies)
+    ai_time = sum(latencies)
+
+    def percentile(q):
+        if not latencies:
+            return 0.0
+        return latencies[min(moves - 1, int(q * moves))]
+
+    return {
+        "games": len(results),
+        "win_rate": statistics.mean(result["won"] for result in results),
+        "moves": moves,
+        "moves_per_second": moves / ai_time if ai_time else 0.0,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": latencies[-1] if latencies else 0.0,
+        "peak_knowledge": max(result["peak_knowledge"] for result in results)
+    }
+
+
+def report(board, summary):
+    """Prints benchmark statistics for one board size."""
+    print(f"{board}: {summary['games']} games")
+    print(f"  Win rate: {100 * summary['win_rate']:.1f}%")
+    print(f"  Moves: {summary['moves']} "
+          f"({summary['moves_per_second']:.0f} per second)")
+    print(f"  Move latency: p50 {1000 * summary['p50']:.3f}ms, "
+          f"p90 {1000 * summary['p90']:.3f}ms, "
+          f"p99 {1000 * summary['p99']:.3f}ms, "
+          f"max {1000 * summary['max']:.3f}ms")
+    print(f"  Peak knowledge base: {summary['peak_knowledge']} sentences")
+
+
+if __name__ == "__main__":
+    main()
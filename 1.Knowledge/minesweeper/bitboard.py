@@ -0,0 +1,340 @@
+import random
+
+from minesweeper import mine_probabilities
+
+
+def neighbour_masks(height, width):
+    """
+    Returns a list giving, for each cell index i * width + j, the bitmask
+    of its neighbouring cells.
+    """
+    masks = []
+    for i in range(height):
+        for j in range(width):
+            mask = 0
+            for n in range(max(0, i - 1), min(height, i + 2)):
+                for m in range(max(0, j - 1), min(width, j + 2)):
+                    if (n, m) != (i, j):
+                        mask |= 1 << (n * width + m)
+            masks.append(mask)
+    return masks
+
+
+def indices(mask):
+    """Yields the index of each set bit of mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitMinesweeper():
+    """
+    Minesweeper game representation with cells as integer indices and
+    the mines as a bitmask. Neighbour masks and neighbour mine counts are
+    computed once per board. Cells are still (i, j) tuples at the
+    interface, so it can stand in for Minesweeper. Every mask is as wide
+    as the board, so this suits boards of up to a few thousand cells.
+    """
+
+    def __init__(self, height=8, width=8, mines=8):
+
+        # Set initial width, height, and number of mines
+        self.height = height
+        self.width = width
+        self.mines = set()
+        self.mine_mask = 0
+
+        # Add mines randomly, drawing as Minesweeper does so that the same
+        # seed gives the same board
+        while len(self.mines) != mines:
+            i = random.randrange(height)
+            j = random.randrange(width)
+            bit = 1 << (i * width + j)
+            if not self.mine_mask & bit:
+                self.mines.add((i, j))
+                self.mine_mask |= bit
+
+        # Precompute neighbours and nearby mine counts
+        self.neighbours = neighbour_masks(height, width)
+        self.counts = [
+            (mask & self.mine_mask).bit_count() for mask in self.neighbours
+        ]
+
+        # At first, player has found no mines
+        self.mines_found = set()
+
+    def index(self, cell):
+        i, j = cell
+        return i * self.width + j
+
+    def print(self):
+        """
+        Prints a text-based representation
+        of where mines are located.
+        """
+        for i in range(self.height):
+            print("--" * self.width + "-")
+            for j in range(self.width):
+                if self.mine_mask >> (i * self.width + j) & 1:
+                    print("|X", end="")
+                else:
+                    print("| ", end="")
+            print("|")
+        print("--" * self.width + "-")
+
+    def is_mine(self, cell):
+        return bool(self.mine_mask >> self.index(cell) & 1)
+
+    def nearby_mines(self, cell):
+        """
+        Returns the number of mines that are
+        within one row and column of a given cell,
+        not including the cell itself.
+        """
+        return self.counts[self.index(cell)]
+
+    def won(self):
+        """
+        Checks if all mines have been flagged.
+        """
+        return self.mines_found == self.mines
+
+
+class BitSentence():
+    """
+    Logical statement about a Minesweeper game
+    A sentence consists of a bitmask of board cells,
+    and a count of the number of those cells which are mines.
+    """
+
+    def __init__(self, cells, count):
+        self.cells = cells
+        self.count = count
+
+    def __eq__(self, other):
+        return self.cells == other.cells and self.count == other.count
+
+    def __str__(self):
+        return f"{set(indices(self.cells))} = {self.count}"
+
+    def known_mines(self):
+        """
+        Returns the mask of all cells in self.cells known to be mines.
+        """
+        if self.cells.bit_count() == self.count:
+            return self.cells
+        return 0
+
+    def known_safes(self):
+        """
+        Returns the mask of all cells in self.cells known to be safe.
+        """
+        if self.count == 0:
+            return self.cells
+        return 0
+
+    def mark_mine(self, index):
+        """
+        Updates internal knowledge representation given the fact that
+        the cell at index is known to be a mine.
+        """
+        bit = 1 << index
+        if self.cells & bit:
+            self.cells ^= bit
+            self.count -= 1
+
+    def mark_safe(self, index):
+        """
+        Updates internal knowledge representation given the fact that
+        the cell at index is known to be safe.
+        """
+        self.cells &= ~(1 << index)
+
+
+class BitMinesweeperAI():
+    """
+    Minesweeper game player using bitmask sentences.
+
+    Has the same interface as MinesweeperAI: cells are (i, j) tuples and
+    self.mines, self.safes and self.moves_made are sets of them. Inside,
+    sentences are kept as BitSentences, so subset tests, differences and
+    counts are single integer operations.
+    """
+
+    def __init__(self, height=8, width=8, mines=8):
+
+        # Set initial height, width and total number of mines
+        self.height = height
+        self.width = width
+        self.total_mines = mines
+        self.neighbours = neighbour_masks(height, width)
+
+        # Keep track of which cells have been clicked on
+        self.moves_made = set()
+
+        # Keep track of cells known to be safe or mines, as sets and masks
+        self.mines = set()
+        self.safes = set()
+        self.mine_mask = 0
+        self.safe_mask = 0
+
+        # Sentences about the game known to be true, keyed by their cells
+        self.knowledge = dict()
+
+        # Index from each cell index to the masks of sentences mentioning it
+        self.cell_sentences = dict()
+
+        # Masks of sentences added or changed since they were last examined
+        self.pending = set()
+
+        # Solutions of frontier components, reused while they are unchanged
+        self.solutions = dict()
+
+    def cell(self, index):
+        return divmod(index, self.width)
+
+    def add_sentence(self, cells, count):
+        """
+        Adds a sentence to the knowledge base unless it is empty or
+        already known, and queues it for inference.
+        """
+        if not cells or cells in self.knowledge:
+            return
+        self.knowledge[cells] = BitSentence(cells, count)
+        for index in indices(cells):
+            self.cell_sentences.setdefault(index, set()).add(cells)
+        self.pending.add(cells)
+
+    def remove_sentence(self, cells):
+        """
+        Removes the sentence with the given cells from the knowledge base
+        and returns it.
+        """
+        sentence = self.knowledge.pop(cells)
+        for index in indices(cells):
+            keys = self.cell_sentences[index]
+            keys.discard(cells)
+            if not keys:
+                del self.cell_sentences[index]
+        self.pending.discard(cells)
+        return sentence
+
+    def mark_mine(self, index):
+        """
+        Marks the cell at index as a mine, and updates all knowledge
+        to mark that cell as a mine as well.
+        """
+        self.mines.add(self.cell(index))
+        self.mine_mask |= 1 << index
+        for cells in list(self.cell_sentences.get(index, ())):
+            sentence = self.remove_sentence(cells)
+            sentence.mark_mine(index)
+            self.add_sentence(sentence.cells, sentence.count)
+
+    def mark_safe(self, index):
+        """
+        Marks the cell at index as safe, and updates all knowledge
+        to mark that cell as safe as well.
+        """
+        self.safes.add(self.cell(index))
+        self.safe_mask |= 1 << index
+        for cells in list(self.cell_sentences.get(index, ())):
+            sentence = self.remove_sentence(cells)
+            sentence.mark_safe(index)
+            self.add_sentence(sentence.cells, sentence.count)
+
+    def add_knowledge(self, cell, count):
+        """
+        Called when the Minesweeper board tells us, for a given
+        safe cell, how many neighboring cells have mines in them.
+        """
+        i, j = cell
+        index = i * self.width + j
+        self.moves_made.add(cell)
+        self.mark_safe(index)
+
+        # Only neighbours not yet known to be mines or safe are unknown
+        neighbours = self.neighbours[index]
+        count -= (neighbours & self.mine_mask).bit_count()
+        self.add_sentence(neighbours & ~(self.mine_mask | self.safe_mask),
+                          count)
+        self.infer()
+
+    def infer(self):
+        """
+        Examines each pending sentence until none are left, as
+        MinesweeperAI.infer does.
+        """
+        while self.pending:
+            cells = self.pending.pop()
+            sentence = self.knowledge[cells]
+
+            # Cells known to be mines or safe leave the knowledge base
+            mines = sentence.known_mines()
+            safes = sentence.known_safes()
+            for index in indices(mines):
+                self.mark_mine(index)
+            for index in indices(safes):
+                self.mark_safe(index)
+            if mines or safes:
+                continue
+
+            # Subset inference against overlapping sentences only
+            overlapping = set()
+            for index in indices(cells):
+                overlapping |= self.cell_sentences[index]
+            overlapping.discard(cells)
+            for other in overlapping:
+                if other not in self.knowledge:
+                    continue
+                common = cells & other
+                if common == cells:
+                    self.add_sentence(
+                        other ^ cells, self.knowledge[other].count - sentence.count
+                    )
+                elif common == other:
+                    self.add_sentence(
+                        cells ^ other, sentence.count - self.knowledge[other].count
+                    )
+
+    def make_safe_move(self):
+        """
+        Returns a safe cell to choose on the Minesweeper board.
+        The move must be known to be safe, and not already a move
+        that has been made.
+        """
+        unmade_safes = self.safes - self.moves_made
+        if not unmade_safes:
+            return None
+        return unmade_safes.pop()
+
+    def make_random_move(self):
+        """
+        Returns the move least likely to be a mine among cells that have
+        not already been chosen and are not known to be mines, as
+        MinesweeperAI.make_random_move does.
+        """
+        allowed_moves = set()
+        for i in range(self.height):
+            for j in range(self.width):
+                allowed_moves.add((i, j))
+        allowed_moves -= self.mines | self.moves_made
+        if not allowed_moves:
+            return None
+
+        # Probabilities for cells in some sentence, and for every other cell
+        sentences = [(frozenset(indices(cells)), sentence.count)
+                     for cells, sentence in self.knowledge.items()]
+        frontier, interior = mine_probabilities(
+            sentences, len(allowed_moves),
+            self.total_mines - len(self.mines), self.solutions
+        )
+        interior_moves = allowed_moves - set(map(self.cell, frontier))
+
+        # Select the least risky cell, at random among the interior cells
+        if frontier:
+            best = min(frontier, key=frontier.get)
+            if not interior_moves or frontier[best] < interior:
+                return self.cell(best)
+        return random.choice(list(interior_moves))
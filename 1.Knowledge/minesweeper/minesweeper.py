@@ -1,6 +1,15 @@
 import itertools
+import math
 import random
 
+# Random draws tried before falling back to a slower way of picking a cell
+SAMPLE_ATTEMPTS = 32
+
+# Backtracking steps solve_component takes on one component before giving
+# up on exact counts and estimating it from sentence densities instead,
+# which bounds the time a guess can take on crowded frontiers
+SOLVE_LIMIT = 20000
+
 
 class Minesweeper():
     """
@@ -147,11 +156,12 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=8):
 
-        # Set initial height and width
+        # Set initial height, width and total number of mines
         self.height = height
         self.width = width
+        self.total_mines = mines
 
         # Keep track of which cells have been clicked on
         self.moves_made = set()
@@ -160,8 +170,58 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Safe cells in the order they were found, used as a stack. Cells
+        # chosen since are only dropped when they reach the top, so
+        # finding a move does not depend on how many have been made
+        self.safe_moves = []
+
+        # Cells not yet chosen nor known to be mines. Only built once random
+        # draws over the whole board start missing (see random_unknown_cell),
+        # then kept up to date: a list for sampling, and positions in it
+        self.unknown_cells = None
+        self.unknown_positions = None
+
+        # Neighbours of each cell, computed when first needed
+        self.neighbours = dict()
+
+        # Sentences about the game known to be true, keyed by their cells
+        self.knowledge = dict()
+
+        # Index from each cell to the keys of the sentences mentioning it
+        self.cell_sentences = dict()
+
+        # Keys of sentences added or changed since they were last examined
+        self.pending = set()
+
+        # Solutions of frontier components, reused while they are unchanged
+        self.solutions = dict()
+
+    def add_sentence(self, cells, count):
+        """
+        Adds a sentence to the knowledge base unless it is empty or
+        already known, and queues it for inference.
+        """
+        key = frozenset(cells)
+        if not key or key in self.knowledge:
+            return
+        self.knowledge[key] = Sentence(key, count)
+        for cell in key:
+            self.cell_sentences.setdefault(cell, set()).add(key)
+        self.pending.add(key)
+
+    def remove_sentence(self, key):
+        """
+        Removes the sentence with the given cells from the knowledge base
+        and returns it.
+        """
+        sentence = self.knowledge.pop(key)
+        for cell in key:
+            keys = self.cell_sentences[cell]
+            keys.discard(key)
+            if not keys:
+                del self.cell_sentences[cell]
+        self.pending.discard(key)
+        return sentence
 
     def mark_mine(self, cell):
         """
@@ -169,18 +229,27 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self.forget(cell)
+        # Only sentences mentioning the cell change; re-file them under
+        # their new cells so they are examined again
+        for key in list(self.cell_sentences.get(cell, ())):
+            sentence = self.remove_sentence(key)
             sentence.mark_mine(cell)
+            self.add_sentence(sentence.cells, sentence.count)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
+        if cell not in self.safes and cell not in self.moves_made:
+            self.safe_moves.append(cell)
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        for key in list(self.cell_sentences.get(cell, ())):
+            sentence = self.remove_sentence(key)
             sentence.mark_safe(cell)
-    
+            self.add_sentence(sentence.cells, sentence.count)
+
     def add_knowledge(self, cell, count):
         """
         Called when the Minesweeper board tells us, for a given
@@ -188,15 +257,16 @@ class MinesweeperAI():
         """
         # 1) Mark the cell as a move that has been made
         self.moves_made.add(cell)
+        self.forget(cell)
 
         # 2) Mark the cell as safe using mark_safe method
         self.mark_safe(cell)
 
         # 3) Add a new sentence to the AI's knowledge base using the value of `cell` and `count`
         # Find neighbours of the cell
-        cell_neighbours = self.find_neighbours(cell)
-        # Check if state of neighbour is already known, if so then remove 
-        known_neighbours = set()        
+        cell_neighbours = set(self.find_neighbours(cell))
+        # Check if state of neighbour is already known, if so then remove
+        known_neighbours = set()
         for neighbour in cell_neighbours:
             if neighbour in self.mines:
                 known_neighbours.add(neighbour)
@@ -204,41 +274,50 @@ class MinesweeperAI():
             elif neighbour in self.safes:
                 known_neighbours.add(neighbour)
         cell_neighbours -= known_neighbours
-        # Create new Sentence instance using unknown neighbours and count
-        new_knowledge = Sentence(cell_neighbours,count)
-        # Add new Sentence to the knowledge base
-        self.knowledge.append(new_knowledge)
-
-        # 4) Mark any additional cells as safe or as mines based on the AI's knowledge base
-        add_mines = set()
-        add_safes = set()
-        # For each Sentence instance in the AI's KB
-        for sentence in self.knowledge:
-            # If the knowledge is empty, remove sentence
-            if len(sentence.cells) == 0:
-                self.knowledge.remove(sentence)
-            # Else, for each knowledge Sentence, check known mines and safes and add to AI's list
-            else:
-                for mine in sentence.known_mines():
-                    add_mines.add(mine)
-                for safe in sentence.known_safes():
-                    add_safes.add(safe)
-        # AI mark mines
-        for mine in add_mines:
-            self.mark_mine(mine)
-        # AI mark safes
-        for safe in add_safes:
-            self.mark_safe(safe)
-        
-        # 5) Add any new knowledge if it can be inferred from existing knowledge
-        # Compare sentences in the KB against each other (but not the same sentence) for subsets
-        infered_knowledge = Sentence(set(),0)
-        for sentence1 in self.knowledge:
-            for sentence2 in self.knowledge:
-                if sentence1 != sentence2:
-                    infered_knowledge = self.knowledge_subset(sentence1,sentence2)
-        # Add infered knowledge, if it exists, to the AI's KB
-        self.knowledge.append(infered_knowledge)
+        self.add_sentence(cell_neighbours, count)
+
+        # 4) and 5) Mark known mines and safes, and infer new sentences,
+        # until nothing changes
+        self.infer()
+
+    def infer(self):
+        """
+        Examines each pending sentence until none are left. A sentence
+        whose cells are all mines or all safe marks them, which changes and
+        re-queues the sentences touching those cells. Otherwise the sentence
+        is compared only with sentences sharing a cell with it, and the
+        difference of any subset pair is added as a new sentence.
+        """
+        while self.pending:
+            key = self.pending.pop()
+            sentence = self.knowledge[key]
+
+            # Cells known to be mines or safe leave the knowledge base
+            mines = list(sentence.known_mines())
+            safes = list(sentence.known_safes())
+            for mine in mines:
+                self.mark_mine(mine)
+            for safe in safes:
+                self.mark_safe(safe)
+            if mines or safes:
+                continue
+
+            # Subset inference against overlapping sentences only
+            overlapping = set()
+            for cell in key:
+                overlapping |= self.cell_sentences[cell]
+            overlapping.discard(key)
+            for other in overlapping:
+                if other not in self.knowledge:
+                    continue
+                if key < other:
+                    self.add_sentence(
+                        other - key, self.knowledge[other].count - sentence.count
+                    )
+                elif other < key:
+                    self.add_sentence(
+                        key - other, sentence.count - self.knowledge[other].count
+                    )
 
     def make_safe_move(self):
         """
@@ -249,39 +328,99 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        # Set of safe moves which have not been made yet
-        unmade_safes = self.safes.difference(self.moves_made)
-        # If no safe move, return None
-        if len(unmade_safes) == 0:
-            return None
-        # Else pick a move which is safe and not yet made
-        else:
-            return unmade_safes.pop()
+        # Pick a move which is safe and not yet made, if there is one,
+        # dropping safe cells chosen since they were found
+        while self.safe_moves and self.safe_moves[-1] in self.moves_made:
+            self.safe_moves.pop()
+        if self.safe_moves:
+            return self.safe_moves[-1]
+        return None
 
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
+        Chooses among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        the cell least likely to be a mine, according to mine_probabilities.
         """
-        all_moves = set()
-        for i in range(self.height):
-            for j in range(self.width):
-                all_moves.add((i,j))
-        # Set of allowed moves
-        allowed_moves = all_moves - self.mines - self.moves_made
+        # Number of allowed moves (moves made and mines never overlap)
+        allowed_moves = (self.height * self.width
+                         - len(self.moves_made) - len(self.mines))
         # If no allowed moves, return None
-        if len(allowed_moves) == 0:
+        if allowed_moves == 0:
             return None
-        # Else select random move
-        else:
-            return allowed_moves.pop()
-    
+
+        # Probabilities for cells in some sentence, and for every other cell
+        sentences = [(key, sentence.count)
+                     for key, sentence in self.knowledge.items()]
+        frontier, interior = mine_probabilities(
+            sentences, allowed_moves,
+            self.total_mines - len(self.mines), self.solutions
+        )
+        interior_moves = allowed_moves - len(frontier)
+
+        # Select the least risky cell, at random among the interior cells
+        if frontier:
+            best = min(frontier, key=frontier.get)
+            if not interior_moves or frontier[best] < interior:
+                return best
+        return self.random_unknown_cell(frontier)
+
+    def random_unknown_cell(self, exclude):
+        """
+        Returns a random cell not yet chosen, not known to be a mine and
+        not in `exclude`, in time independent of the board size while such
+        cells are common.
+        """
+        if self.unknown_cells is None:
+
+            # Draw from the whole board while most of it is unknown
+            for attempt in range(SAMPLE_ATTEMPTS):
+                cell = (random.randrange(self.height),
+                        random.randrange(self.width))
+                if (cell not in self.moves_made and cell not in self.mines
+                        and cell not in exclude):
+                    return cell
+
+            # Otherwise build the unknown cells once and maintain them
+            self.unknown_cells = [
+                (i, j) for i in range(self.height) for j in range(self.width)
+                if (i, j) not in self.moves_made and (i, j) not in self.mines
+            ]
+            self.unknown_positions = {
+                cell: position
+                for position, cell in enumerate(self.unknown_cells)
+            }
+
+        for attempt in range(SAMPLE_ATTEMPTS):
+            cell = random.choice(self.unknown_cells)
+            if cell not in exclude:
+                return cell
+        return random.choice(
+            [cell for cell in self.unknown_cells if cell not in exclude]
+        )
+
+    def forget(self, cell):
+        """
+        Removes a cell that has been chosen or found to be a mine from
+        the unknown cells, if they have been built.
+        """
+        if self.unknown_positions is None or cell not in self.unknown_positions:
+            return
+        # Move the last cell into the removed cell's place
+        position = self.unknown_positions.pop(cell)
+        last = self.unknown_cells.pop()
+        if last != cell:
+            self.unknown_cells[position] = last
+            self.unknown_positions[last] = position
+
     def find_neighbours(self, cell):
         """
         For cell (i,j), find immediate neighbours
         """
+        if cell in self.neighbours:
+            return self.neighbours[cell]
         i,j = cell
         neighbours = set()
         for n in range(i-1,i+2):
@@ -289,19 +428,221 @@ class MinesweeperAI():
                 if (n,m) != (i,j):  # exclude the safe cell
                     if 0 <= n < self.height and 0 <= m < self.width: # check row falls within the height,width of grid
                         neighbours.add((n,m))
-        return neighbours
-
-    def knowledge_subset(self,sentence1,sentence2):
-        set1 = sentence1.cells
-        set2 = sentence2.cells
-        infered_cells = set()
-        infered_count = 0
-        # If cells are a subset
-        if set1.issubset(set2):
-            # Subtract to get the remaining cells
-            infered_cells = set2.difference(set1)
-            # Subtract the count difference
-            infered_count = sentence2.count - sentence1.count
-        # Create new knowledge Sentence using infered cells and count
-        infered_knowledge = Sentence(infered_cells,infered_count)
-        return infered_knowledge
\ No newline at end of file
+        self.neighbours[cell] = frozenset(neighbours)
+        return self.neighbours[cell]
+
+
+def solve_component(sentences, limit=SOLVE_LIMIT):
+    """
+    Enumerates the mine configurations consistent with a connected group
+    of sentences, given as (cells, count) pairs, by backtracking.
+
+    Returns (cells, totals, cell_totals) where cells is a list of the
+    cells involved, totals[k] is the number of configurations with k mines
+    and cell_totals[k][i] the number of those in which cells[i] is a mine.
+
+    If backtracking takes more than `limit` steps, the result is instead
+    estimated by estimate_component.
+    """
+    # Order cells sentence by sentence so constraints close early
+    cells = []
+    seen = set()
+    for key, count in sentences:
+        for cell in key:
+            if cell not in seen:
+                seen.add(cell)
+                cells.append(cell)
+    index = {cell: i for i, cell in enumerate(cells)}
+    constraints = [[index[cell] for cell in key] for key, count in sentences]
+    cell_constraints = [[] for cell in cells]
+    for c, members in enumerate(constraints):
+        for i in members:
+            cell_constraints[i].append(c)
+
+    # Mines still to place and cells still unassigned in each sentence
+    needed = [count for key, count in sentences]
+    unassigned = [len(members) for members in constraints]
+
+    totals = dict()
+    cell_totals = dict()
+
+    # Depth-first search with an explicit stack, so components of any size
+    # fit: choices[i] is the value being tried for cells[i] (0 safe, 1
+    # mine), or -1 before the first and once both have been tried
+    choices = [-1] * len(cells)
+    i = 0
+    mines = 0
+    steps = 0
+    while i >= 0:
+        if i == len(cells):
+            totals[mines] = totals.get(mines, 0) + 1
+            counts = cell_totals.setdefault(mines, [0] * len(cells))
+            for j, is_mine in enumerate(choices):
+                if is_mine:
+                    counts[j] += 1
+            i -= 1
+            continue
+
+        # Undo the value last tried for this cell, and move on to the next
+        is_mine = choices[i]
+        if is_mine >= 0:
+            mines -= is_mine
+            for c in cell_constraints[i]:
+                unassigned[c] += 1
+                needed[c] += is_mine
+        is_mine += 1
+        if is_mine == 2:
+            choices[i] = -1
+            i -= 1
+            continue
+        choices[i] = is_mine
+        mines += is_mine
+
+        # Only go deeper if every sentence of the cell can still be met
+        consistent = True
+        for c in cell_constraints[i]:
+            unassigned[c] -= 1
+            needed[c] -= is_mine
+            if needed[c] < 0 or needed[c] > unassigned[c]:
+                consistent = False
+        if consistent:
+            steps += 1
+            if steps > limit:
+                return estimate_component(sentences, cells)
+            i += 1
+
+    return cells, totals, cell_totals
+
+
+def estimate_component(sentences, cells):
+    """
+    Approximates solve_component for a group of sentences over `cells`
+    without enumerating it, taking each cell's chance of being a mine to be
+    the mean density (count over size) of the sentences mentioning it.
+
+    Returns a result in the form of solve_component's, with a single
+    configuration placing the rounded expected number of mines and
+    fractional counts for each cell.
+    """
+    densities = {cell: [] for cell in cells}
+    for key, count in sentences:
+        for cell in key:
+            densities[cell].append(count / len(key))
+    probabilities = [sum(densities[cell]) / len(densities[cell])
+                     for cell in cells]
+    mines = round(sum(probabilities))
+    return cells, {mines: 1}, {mines: probabilities}
+
+
+def convolve(a, b):
+    """Combines two dicts of configuration counts keyed by mine count."""
+    result = dict()
+    for i, x in a.items():
+        for j, y in b.items():
+            result[i + j] = result.get(i + j, 0) + x * y
+    return result
+
+
+def mine_probabilities(sentences, unknown, mines_left, solutions=None):
+    """
+    Computes the probability that each unknown cell is a mine, exactly
+    unless a component is too large to enumerate (see SOLVE_LIMIT).
+
+    `sentences` are (cells, count) pairs over unknown cells, `unknown` is
+    the number of unknown cells on the board and `mines_left` the number
+    of mines among them. Sentences are split into independent components
+    that are solved separately by solve_component and combined using the
+    global mine count: a combination placing K mines in the sentences
+    leaves C(interior, mines_left - K) ways to place the rest.
+
+    `solutions` is a dict caching component solutions between calls; it is
+    pruned to the components seen in this call.
+
+    Returns (frontier, interior) where frontier maps each cell in some
+    sentence to its probability and interior is the probability for every
+    other unknown cell.
+    """
+    # Group sentences into components connected by shared cells
+    parent = dict()
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for key, count in sentences:
+        cells = list(key)
+        for cell in cells:
+            parent.setdefault(cell, cell)
+        for cell in cells[1:]:
+            parent[find(cell)] = find(cells[0])
+    groups = dict()
+    for key, count in sentences:
+        groups.setdefault(find(next(iter(key))), []).append((key, count))
+
+    # Solve each component, reusing solutions of unchanged components
+    if solutions is None:
+        solutions = dict()
+    components = []
+    used = set()
+    for group in groups.values():
+        signature = frozenset(group)
+        if signature not in solutions:
+            solutions[signature] = solve_component(group)
+        used.add(signature)
+        components.append(solutions[signature])
+    for signature in list(solutions):
+        if signature not in used:
+            del solutions[signature]
+
+    interior = unknown - len(parent)
+
+    # Ways to place the mines not among the frontier cells, given k mines
+    # among them, relative to the most likely k. Logarithms keep this cheap
+    # when the interior is large.
+    def log_comb(k):
+        rest = mines_left - k
+        return (math.lgamma(interior + 1) - math.lgamma(rest + 1)
+                - math.lgamma(interior - rest + 1))
+
+    feasible = [k for k in range(len(parent) + 1)
+                if 0 <= mines_left - k <= interior]
+    reference = max(map(log_comb, feasible), default=0.0)
+    weights = {k: math.exp(log_comb(k) - reference) for k in feasible}
+
+    def weight(k):
+        return weights.get(k, 0.0)
+
+    # Configuration counts of all components but one, from prefix and
+    # suffix convolutions
+    prefix = [{0: 1}]
+    for cells, totals, cell_totals in components:
+        prefix.append(convolve(prefix[-1], totals))
+    suffix = [{0: 1}]
+    for cells, totals, cell_totals in reversed(components):
+        suffix.append(convolve(suffix[-1], totals))
+    suffix.reverse()
+
+    total = sum(n * weight(k) for k, n in prefix[-1].items())
+    if total == 0:
+        # Knowledge is inconsistent with the mine count; treat all alike
+        return {cell: 0.5 for cell in parent}, 0.5
+
+    frontier = dict()
+    for c, (cells, totals, cell_totals) in enumerate(components):
+        others = convolve(prefix[c], suffix[c + 1])
+        for k, counts in cell_totals.items():
+            ways = sum(n * weight(k + j) for j, n in others.items())
+            for cell, n in zip(cells, counts):
+                frontier[cell] = frontier.get(cell, 0) + n * ways
+    frontier = {cell: ways / total for cell, ways in frontier.items()}
+
+    # Expected number of interior mines, spread evenly over interior cells
+    if interior:
+        expected = sum(n * weight(k) * (mines_left - k)
+                       for k, n in prefix[-1].items())
+        interior_probability = expected / total / interior
+    else:
+        interior_probability = 1.0
+    return frontier, interior_probability
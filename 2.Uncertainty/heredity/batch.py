@@ -0,0 +1,146 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+
+import heredity
+
+# Families handed to each worker process at a time
+FAMILY_BATCH = 16
+
+# Output columns of the CSV format
+FIELDS = ["family", "person", "gene_2", "gene_1", "gene_0",
+          "trait_true", "trait_false"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compute gene and trait probabilities for many "
+                    "families in parallel."
+    )
+    parser.add_argument("paths", nargs="+",
+                        help="family CSV files, directories of them, "
+                             "or glob patterns")
+    parser.add_argument("-f", "--format", choices=["csv", "jsonl"],
+                        default="csv", help="output format")
+    parser.add_argument("-o", "--output", default=None,
+                        help="output file (default: standard output)")
+    parser.add_argument("-m", "--method", choices=list(heredity.METHODS),
+                        default="eliminate", help="inference method")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    filenames = find_families(args.paths)
+    if not filenames:
+        parser.error("no family files found")
+
+    output = (sys.stdout if args.output is None
+              else open(args.output, "w", newline=""))
+    failures = 0
+    try:
+        write = writer(output, args.format)
+        for filename, probabilities, error in run_families(
+            filenames, args.method, args.processes
+        ):
+            if error is not None:
+                failures += 1
+                print(f"{filename}: {error}", file=sys.stderr)
+                continue
+            for row in rows(filename, probabilities):
+                write(row)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if failures:
+        sys.exit(f"{failures} of {len(filenames)} families failed")
+
+
+def find_families(paths):
+    """
+    Return the sorted list of family files named by `paths`, each a file,
+    a directory (every .csv file under it) or a glob pattern.
+    """
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(path, "**", "*.csv"),
+                                recursive=True)
+        elif os.path.isfile(path):
+            matches = [path]
+        else:
+            matches = glob.glob(path, recursive=True)
+        filenames.update(match for match in matches if os.path.isfile(match))
+    return sorted(filenames)
+
+
+def infer_family(filename, method="eliminate"):
+    """
+    Return (filename, probabilities, error) for one family file, where
+    probabilities is as returned by the inference method, in the file's
+    order of people, and error is
+    None, or a message and probabilities None if the family failed.
+    Sampling methods run in the calling process, which is already a worker.
+    """
+    try:
+        people = heredity.load_data(filename)
+        if method in heredity.SAMPLERS:
+            probabilities = heredity.METHODS[method](people, processes=1)
+        else:
+            probabilities = heredity.METHODS[method](people)
+        return filename, {
+            person: probabilities[person] for person in people
+        }, None
+    except Exception as e:
+        return filename, None, f"{type(e).__name__}: {e}"
+
+
+def run_families(filenames, method="eliminate", processes=None):
+    """
+    Yield infer_family results for `filenames` in order, as each becomes
+    available, computing them in a pool of worker processes. Each worker
+    imports heredity and its model once and then takes families in
+    batches.
+    """
+    with ProcessPoolExecutor(processes) as executor:
+        yield from executor.map(infer_family, filenames,
+                                [method] * len(filenames),
+                                chunksize=FAMILY_BATCH)
+
+
+def rows(filename, probabilities):
+    """Yield one output row, a dict keyed by FIELDS, per person."""
+    for person, distributions in probabilities.items():
+        gene = distributions["gene"]
+        trait = distributions["trait"]
+        yield {
+            "family": filename,
+            "person": person,
+            "gene_2": gene[2],
+            "gene_1": gene[1],
+            "gene_0": gene[0],
+            "trait_true": trait[True],
+            "trait_false": trait[False]
+        }
+
+
+def writer(output, output_format):
+    """
+    Return a function writing one row to `output` as CSV, after a header
+    line, or as a line of JSON.
+    """
+    if output_format == "jsonl":
+        def write(row):
+            output.write(json.dumps(row) + "\n")
+        return write
+    csv_writer = csv.DictWriter(output, fieldnames=FIELDS)
+    csv_writer.writeheader()
+    return csv_writer.writerow
+
+
+if __name__ == "__main__":
+    main()
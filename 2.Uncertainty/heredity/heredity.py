@@ -1,7 +1,12 @@
 import csv
 import itertools
+import os
 import sys
 
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 PROBS = {
 
     # Unconditional probabilities for having gene
@@ -36,13 +41,57 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Assignments evaluated at a time by batch_enumerate_probabilities
+ENUMERATION_BATCH = 1 << 14
+
+# Gibbs sweeps kept per chain after BURN_IN discarded ones, over CHAINS
+# chains, or likelihood-weighted samples drawn in total, WEIGHTING_BATCH
+# at a time
+SAMPLES = 2000
+BURN_IN = 200
+CHAINS = 4
+WEIGHTING_BATCH = 1 << 12
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3
+                                       and sys.argv[2] not in METHODS):
+        sys.exit("Usage: python heredity.py data.csv "
+                 f"[{'|'.join(METHODS)}]")
     people = load_data(sys.argv[1])
+    method = sys.argv[2] if len(sys.argv) == 3 else "eliminate"
+
+    # Compute gene and trait probabilities for each person, reporting how
+    # well sampling methods converged
+    if method in SAMPLERS:
+        diagnostics = dict()
+        probabilities = METHODS[method](people, diagnostics=diagnostics)
+        for name, value in diagnostics.items():
+            if isinstance(value, float):
+                print(f"{name}: {value:.4g}", file=sys.stderr)
+    else:
+        probabilities = METHODS[method](people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+
+
+def enumerate_probabilities(people):
+    """
+    Return each person's gene and trait distributions given the known
+    traits, by summing the joint probability of every assignment of genes
+    and traits consistent with them (see assignments). The number of
+    assignments grows as 3^n times 2 for each unknown trait, so this only
+    suits small families.
+    """
 
     # Keep track of gene and trait probabilities for each person
     probabilities = {
@@ -60,38 +109,80 @@ def main():
         for person in people
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
+    # Add up the joint probability of every assignment matching evidence
+    for one_gene, two_genes, have_trait, p in assignments(people):
+        update(probabilities, one_gene, two_genes, have_trait, p)
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+    # Ensure probabilities sum to 1
+    return normalize(probabilities)
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+def topological_order(people):
+    """
+    Return the names of people ordered so that parents come before their
+    children.
+    """
+    order = []
+    placed = set()
 
-    # Ensure probabilities sum to 1
-    normalize(probabilities)
+    def place(person):
+        if person in placed:
+            return
+        placed.add(person)
+        for parent in (people[person]["mother"], people[person]["father"]):
+            if parent is not None:
+                place(parent)
+        order.append(person)
 
-    # Print results
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        place(person)
+    return order
+
+
+def assignments(people):
+    """
+    Yield (one_gene, two_genes, have_trait, p) for every assignment of
+    genes and traits consistent with the known traits, where p is its
+    joint probability, as joint_probability would compute it.
+
+    People are assigned one at a time, parents before children, carrying
+    the product of the factors so far: known traits are fixed rather than
+    enumerated, and a branch is dropped as soon as its product is zero.
+    Assignments are generated lazily, so memory stays linear in the size
+    of the family.
+    """
+    order = topological_order(people)
+    genes = dict()
+    traits = dict()
+
+    def extend(index, p):
+        if index == len(order):
+            yield (
+                {person for person in order if genes[person] == 1},
+                {person for person in order if genes[person] == 2},
+                {person for person in order if traits[person]},
+                p
+            )
+            return
+        person = order[index]
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        known = people[person]["trait"]
+        for num_genes in (0, 1, 2):
+            if mother is None:
+                p_gene = PROBS["gene"][num_genes]
+            else:
+                p_gene = child_gene_probability(num_genes, genes[mother],
+                                                genes[father])
+            genes[person] = num_genes
+            for trait in ((True, False) if known is None else (known,)):
+                p_person = p * p_gene * PROBS["trait"][num_genes][trait]
+                if p_person == 0:
+                    continue
+                traits[person] = trait
+                yield from extend(index + 1, p_person)
+
+    yield from extend(0, 1)
 
 
 def load_data(filename):
@@ -173,6 +264,30 @@ def inherits_gene(genes_parent, from_parent):
         else:
             return 1 - PROBS["mutation"]
     
+def child_gene_probability(num_genes, genes_mother, genes_father):
+    """
+    Return the probability of a child having `num_genes` copies of the
+    gene given that its mother and father have `genes_mother` and
+    `genes_father` copies.
+    """
+    # If child has 0 genes
+    if num_genes == 0:
+        # Assume 0 genes from each parent ie. P(not mother, not father) 
+        # ==> P(not mother)*P(not father)
+        p_gene = inherits_gene(genes_mother, False) * inherits_gene(genes_father, False)
+    # If child has 1 gene
+    elif num_genes == 1:
+        # Can inherit 1 gene from either parent ie. P(mother, not father) or P(father, not mother) 
+        # ==> P(mother)*P(not father) + P(father)*P(not mother)
+        p_gene = inherits_gene(genes_mother, True) * inherits_gene(genes_father, False) \
+            + inherits_gene(genes_mother, False) * inherits_gene(genes_father, True)
+    # If child has 2 genes
+    elif num_genes == 2:
+        # Assume 1 gene from each parent ie. P(mother, father) 
+        # ==> P(mother)*P(father)
+        p_gene = inherits_gene(genes_mother, True) * inherits_gene(genes_father, True)
+    return p_gene
+
 def joint_probability(people, one_gene, two_genes, have_trait):
     """
     Compute and return a joint probability.
@@ -224,22 +339,7 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         genes_mother = person_values[mother]["n_genes"]
         genes_father = person_values[father]["n_genes"]
         # Calculate gene probability for child, given parent info
-        # If child has 0 genes
-        if num_genes == 0:
-            # Assume 0 genes from each parent ie. P(not mother, not father) 
-            # ==> P(not mother)*P(not father)
-            p_gene = inherits_gene(genes_mother, False) * inherits_gene(genes_father, False)
-        # If child has 1 gene
-        elif num_genes == 1:
-            # Can inherit 1 gene from either parent ie. P(mother, not father) or P(father, not mother) 
-            # ==> P(mother)*P(not father) + P(father)*P(not mother)
-            p_gene = inherits_gene(genes_mother, True) * inherits_gene(genes_father, False) \
-                + inherits_gene(genes_mother, False) * inherits_gene(genes_father, True)
-        # If child has 2 genes
-        elif num_genes == 2:
-            # Assume 1 gene from each parent ie. P(mother, father) 
-            # ==> P(mother)*P(father)
-            p_gene = inherits_gene(genes_mother, True) * inherits_gene(genes_father, True)
+        p_gene = child_gene_probability(num_genes, genes_mother, genes_father)
         # Store gene probability for child
         person_values[child]["p_gene"] = p_gene
         # Trait probability
@@ -261,10 +361,10 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
     for person in probabilities:
         # Calculate number of genes
         num_genes = calc_genes(person, one_gene, two_genes)
-        # Assign gene probability
-        probabilities[person]["gene"][num_genes] = p
-        # Asign trait probability
-        probabilities[person]["trait"][person in have_trait] = p
+        # Add to gene probability
+        probabilities[person]["gene"][num_genes] += p
+        # Add to trait probability
+        probabilities[person]["trait"][person in have_trait] += p
 
 def normalize(probabilities):
     """
@@ -285,5 +385,681 @@ def normalize(probabilities):
 
     return probabilities
 
+
+def inheritance_table():
+    """
+    Return an array whose [mother, father, child] entry is the probability
+    of a child having `child` copies of the gene, given that its mother
+    and father have `mother` and `father` copies.
+    """
+    table = np.zeros((3, 3, 3))
+    for mother, father in itertools.product(range(3), repeat=2):
+        for from_mother, from_father in itertools.product((False, True),
+                                                          repeat=2):
+            table[mother, father, from_mother + from_father] += (
+                inherits_gene(mother, from_mother)
+                * inherits_gene(father, from_father)
+            )
+    return table
+
+
+class Pedigree():
+    """
+    A family compiled for repeated evaluation.
+
+    People are indexed in topological order, so parents come before their
+    children. names[i] is the name of person i, and mothers[i] and
+    fathers[i] are the indices of their parents, or -1 for people with no
+    parents listed. traits[i] is 1 or 0 if the trait is known and -1 if
+    not. The gene and trait distributions are held as arrays: prior[g],
+    inheritance[mother, father, child] (see inheritance_table) and
+    trait_table[g, t] for the trait t = 0 or 1.
+    """
+
+    def __init__(self, people):
+        self.names = topological_order(people)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.mothers = np.array([
+            self.index.get(people[name]["mother"], -1) for name in self.names
+        ], dtype=np.int64)
+        self.fathers = np.array([
+            self.index.get(people[name]["father"], -1) for name in self.names
+        ], dtype=np.int64)
+        self.founders = self.mothers < 0
+        self.traits = np.array([
+            -1 if people[name]["trait"] is None else int(people[name]["trait"])
+            for name in self.names
+        ], dtype=np.int64)
+        self.prior = np.array([PROBS["gene"][genes] for genes in range(3)])
+        self.inheritance = inheritance_table()
+        self.trait_table = np.array([
+            [PROBS["trait"][genes][False], PROBS["trait"][genes][True]]
+            for genes in range(3)
+        ])
+
+        # Probability of each person's known trait for each number of
+        # genes, or 1 if unknown
+        self.evidence = np.ones((len(self.names), 3))
+        known = self.traits >= 0
+        self.evidence[known] = self.trait_table[:, self.traits[known]].T
+
+        # Children of each person
+        self.children = [[] for _ in self.names]
+        for i in np.flatnonzero(~self.founders):
+            self.children[self.mothers[i]].append(i)
+            self.children[self.fathers[i]].append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, one_gene, two_genes, have_trait):
+        """
+        Return (genes, traits) arrays for one assignment given as the sets
+        joint_probability takes.
+        """
+        genes = np.array([
+            calc_genes(name, one_gene, two_genes) for name in self.names
+        ], dtype=np.int64)
+        traits = np.array([name in have_trait for name in self.names],
+                          dtype=np.int64)
+        return genes, traits
+
+    def joint_probability(self, genes, traits):
+        """
+        Return the joint probability of each row of assignments, where
+        genes[k, i] is the number of genes and traits[k, i] the trait (0
+        or 1) of person i in assignment k. A single assignment may be
+        given as one-dimensional arrays, returning a single probability.
+        """
+        genes = np.asarray(genes)
+        traits = np.asarray(traits)
+
+        # Founders' genes follow the prior, everyone else's their parents'
+        # genes; the parent index -1 of founders is masked out
+        p_gene = np.where(
+            self.founders,
+            self.prior[genes],
+            self.inheritance[genes[..., self.mothers],
+                             genes[..., self.fathers], genes]
+        )
+        p_trait = self.trait_table[genes, traits]
+        return np.prod(p_gene * p_trait, axis=-1)
+
+    def sample_genes(self, rng, size):
+        """
+        Return `size` assignments of genes drawn from the prior with `rng`,
+        ignoring traits, as an array of shape (size, number of people).
+        Each person is drawn after their parents.
+        """
+        genes = np.empty((size, len(self)), dtype=np.int64)
+        for i in range(len(self)):
+            if self.founders[i]:
+                weights = np.broadcast_to(self.prior, (size, 3))
+            else:
+                weights = self.inheritance[genes[:, self.mothers[i]],
+                                           genes[:, self.fathers[i]]]
+            genes[:, i] = choose(rng, weights)
+        return genes
+
+    def factors(self):
+        """
+        Return the factors of the family as a Bayesian network over each
+        person's number of genes, as (scope, table) pairs where scope is a
+        tuple of person indices and table an array indexed by their
+        numbers of genes.
+
+        Traits depend only on their own person's genes, so each known
+        trait is absorbed as a likelihood factor and unknown traits drop
+        out.
+        """
+        factors = []
+        for i in range(len(self)):
+            if self.founders[i]:
+                factors.append(((i,), self.prior))
+            else:
+                factors.append(((self.mothers[i], self.fathers[i], i),
+                                self.inheritance))
+            if self.traits[i] >= 0:
+                factors.append(((i,), self.trait_table[:, self.traits[i]]))
+        return factors
+
+    def probabilities(self, genes, has_trait):
+        """
+        Return gene and trait distributions in the form main prints, from
+        an array of each person's gene distribution and an array of each
+        person's probability of having the trait.
+        """
+        return {
+            name: {
+                "gene": {
+                    gene: float(genes[i, gene]) for gene in PROBS["gene"]
+                },
+                "trait": {
+                    True: float(has_trait[i]),
+                    False: float(1 - has_trait[i])
+                }
+            }
+            for i, name in enumerate(self.names)
+        }
+
+
+def combine(factors, scope):
+    """
+    Multiply `factors` and sum out every variable not in `scope`,
+    returning the result as a (scope, table) factor scaled to sum to 1.
+    Scaling keeps products over large families from underflowing and does
+    not change any normalized distribution.
+    """
+    labels = dict()
+    operands = []
+    for variables, table in factors:
+        operands.append(table)
+        operands.append([labels.setdefault(v, len(labels))
+                         for v in variables])
+
+    # Variables of the scope missing from every factor are uniform
+    for variable in scope:
+        if variable not in labels:
+            operands.append(np.ones(3))
+            operands.append([labels.setdefault(variable, len(labels))])
+
+    table = np.einsum(*operands, [labels[v] for v in scope])
+    return scope, table / table.sum()
+
+
+def elimination_order(factors, names):
+    """
+    Return (order, cliques) for eliminating every variable of `factors`,
+    choosing at each step the variable whose elimination adds the fewest
+    edges between its neighbours (ties broken by fewest neighbours, then
+    by position in `names`). cliques maps each variable to the set of it
+    and its neighbours when it was eliminated.
+    """
+    neighbours = {name: set() for name in names}
+    for scope, _ in factors:
+        for variable in scope:
+            neighbours[variable].update(scope)
+    for variable in neighbours:
+        neighbours[variable].discard(variable)
+    position = {name: i for i, name in enumerate(names)}
+
+    def cost(variable):
+        adjacent = list(neighbours[variable])
+        fill = sum(
+            1 for i, a in enumerate(adjacent) for b in adjacent[i + 1:]
+            if b not in neighbours[a]
+        )
+        return fill, len(adjacent), position[variable]
+
+    costs = {variable: cost(variable) for variable in neighbours}
+    order = []
+    cliques = dict()
+    while costs:
+        variable = min(costs, key=costs.get)
+        del costs[variable]
+        adjacent = neighbours.pop(variable)
+        order.append(variable)
+        cliques[variable] = adjacent | {variable}
+
+        # Connect the neighbours, whose costs and their neighbours' change
+        affected = set(adjacent)
+        for a in adjacent:
+            neighbours[a].discard(variable)
+            neighbours[a].update(adjacent - {a})
+            affected.update(neighbours[a])
+        for a in affected:
+            costs[a] = cost(a)
+    return order, cliques
+
+
+def gene_marginals(pedigree):
+    """
+    Return an array whose row i gives the probabilities of person i of
+    the pedigree having 0, 1 and 2 copies of the gene given the known
+    traits.
+
+    The elimination order defines a junction tree with one clique per
+    person, whose parent is the clique of the first person eliminated
+    after it among its neighbours. Each factor is assigned to the clique of
+    the first person in its scope to be eliminated. One pass of messages up
+    the tree and one back down give every clique its marginal, so all
+    marginals cost about as much as two eliminations.
+    """
+    factors = pedigree.factors()
+    order, cliques = elimination_order(factors, range(len(pedigree)))
+    position = {name: i for i, name in enumerate(order)}
+
+    # Build the junction tree
+    separators = dict()
+    parents = dict()
+    children = {name: [] for name in order}
+    for name in order:
+        separators[name] = tuple(
+            sorted(cliques[name] - {name}, key=position.get)
+        )
+        parents[name] = separators[name][0] if separators[name] else None
+        if parents[name] is not None:
+            children[parents[name]].append(name)
+    assigned = {name: [] for name in order}
+    for factor in factors:
+        assigned[min(factor[0], key=position.get)].append(factor)
+
+    # Collect messages from the leaves up, in elimination order
+    up = dict()
+    for name in order:
+        incoming = assigned[name] + [up[child] for child in children[name]]
+        up[name] = combine(incoming, separators[name])
+
+    # Distribute messages from the roots down, and read off marginals
+    down = dict()
+    marginals = np.zeros((len(pedigree), 3))
+    for name in reversed(order):
+        incoming = list(assigned[name])
+        if parents[name] is not None:
+            incoming.append(down[name])
+        for child in children[name]:
+            others = [up[other] for other in children[name] if other != child]
+            down[child] = combine(incoming + others, separators[child])
+        _, marginals[name] = combine(
+            incoming + [up[child] for child in children[name]], (name,)
+        )
+    return marginals
+
+
+def eliminate_probabilities(people):
+    """
+    Return each person's gene and trait distributions given the known
+    traits, in the form enumerate_probabilities does, by exact inference
+    on the junction tree of the family (see gene_marginals).
+    """
+    pedigree = Pedigree(people)
+    genes = gene_marginals(pedigree)
+    has_trait = np.where(pedigree.traits >= 0, pedigree.traits,
+                         genes @ pedigree.trait_table[:, 1])
+    return pedigree.probabilities(genes, has_trait)
+
+
+def batch_assignments(pedigree, batch_size=ENUMERATION_BATCH):
+    """
+    Yield (genes, traits) arrays of up to `batch_size` rows at a time
+    (see Pedigree.joint_probability), together covering every assignment
+    consistent with the known traits once. Known traits are fixed, and
+    each row decodes its position in the enumeration as mixed-radix digits:
+    one of 3 for every person's genes and one of 2 for every unknown trait.
+    """
+    unknown = np.flatnonzero(pedigree.traits < 0)
+    radices = [3] * len(pedigree) + [2] * len(unknown)
+    total = 3 ** len(pedigree) * 2 ** len(unknown)
+    for start in range(0, total, batch_size):
+        codes = np.arange(start, min(start + batch_size, total),
+                          dtype=np.int64)
+        digits = np.empty((len(codes), len(radices)), dtype=np.int64)
+        for k, radix in enumerate(radices):
+            codes, digits[:, k] = np.divmod(codes, radix)
+        traits = np.broadcast_to(pedigree.traits,
+                                 (len(digits), len(pedigree))).copy()
+        traits[:, unknown] = digits[:, len(pedigree):]
+        yield digits[:, :len(pedigree)], traits
+
+
+def batch_enumerate_probabilities(people):
+    """
+    Return each person's gene and trait distributions as
+    enumerate_probabilities does, evaluating the joint probabilities of
+    batches of assignments at once on the compiled pedigree.
+    """
+    pedigree = Pedigree(people)
+    genes = np.zeros((len(pedigree), 3))
+    traits = np.zeros((len(pedigree), 2))
+    for gene_batch, trait_batch in batch_assignments(pedigree):
+        p = pedigree.joint_probability(gene_batch, trait_batch)
+        genes += np.einsum("k,kig->ig", p, np.eye(3)[gene_batch])
+        traits += np.einsum("k,kit->it", p, np.eye(2)[trait_batch])
+    genes /= genes.sum(axis=1, keepdims=True)
+    traits /= traits.sum(axis=1, keepdims=True)
+    return pedigree.probabilities(genes, traits[:, 1])
+
+
+def choose(rng, weights):
+    """
+    Return, for each row of `weights`, an index drawn with `rng` with
+    probability proportional to that row's weights.
+    """
+    cumulative = np.cumsum(weights, axis=-1)
+    draws = rng.random(cumulative.shape[:-1]) * cumulative[..., -1]
+    index = (cumulative < draws[..., None]).sum(axis=-1)
+    return np.minimum(index, weights.shape[-1] - 1)
+
+
+def gibbs_blocks(pedigree):
+    """
+    Return the blocks of people Gibbs sampling updates together, as tuples
+    of indices: the parents of each nuclear family, unless either is
+    already in an earlier block, and everyone else alone. Parents of the
+    same children are strongly correlated, so updating them jointly mixes
+    far faster than updating each given the other.
+    """
+    blocks = []
+    placed = set()
+    for i in np.flatnonzero(~pedigree.founders):
+        couple = (int(pedigree.mothers[i]), int(pedigree.fathers[i]))
+        if not placed.intersection(couple):
+            blocks.append(couple)
+            placed.update(couple)
+    blocks.extend((i,) for i in range(len(pedigree)) if i not in placed)
+    return blocks
+
+
+def block_factors(pedigree, block):
+    """
+    Return the people whose factors mention the genes of `block`: its
+    members, for their own genes, and their children, for their parents'.
+    """
+    people = set(block)
+    for i in block:
+        people.update(pedigree.children[i])
+    return sorted(people)
+
+
+def block_colours(pedigree, blocks):
+    """
+    Return a list of groups of indices into `blocks`, such that no block's
+    update reads the genes of another block in its group. Blocks in a
+    group are independent given everyone outside it, so the whole group can
+    be updated at once.
+    """
+    block_of = dict()
+    for b, block in enumerate(blocks):
+        for i in block:
+            block_of[i] = b
+
+    # Blocks whose updates read each other's genes may not share a colour
+    conflicts = [set() for _ in blocks]
+    for b, block in enumerate(blocks):
+        for person in block_factors(pedigree, block):
+            reads = [person]
+            if not pedigree.founders[person]:
+                reads += [pedigree.mothers[person], pedigree.fathers[person]]
+            for i in reads:
+                if block_of[i] != b:
+                    conflicts[b].add(block_of[i])
+                    conflicts[block_of[i]].add(b)
+
+    colours = []
+    colour_of = dict()
+    for b in range(len(blocks)):
+        used = {colour_of[c] for c in conflicts[b] if c in colour_of}
+        colour = next(c for c in itertools.count() if c not in used)
+        if colour == len(colours):
+            colours.append([])
+        colours[colour].append(b)
+        colour_of[b] = colour
+    return colours
+
+
+def group_plan(pedigree, group):
+    """
+    Return what a Gibbs update of a `group` of blocks of the same size
+    needs, as a tuple of:
+        * members, an array of the blocks' members, one row per block,
+        * states, every joint assignment of genes to a block's members,
+        * people, the people whose factors mention each block (see
+          block_factors), one row per block, padded to the same length,
+        * sources, where to read the genes of those people and of their
+          mothers and fathers: a person index, or the number of people
+          plus a position in the block for the block's own members,
+        * founders, whether each of those people is a founder, and
+        * padding, which entries of people are only padding.
+    """
+    n_people = len(pedigree)
+    members = np.array(group, dtype=np.int64)
+    states = np.array(list(itertools.product(range(3),
+                                             repeat=members.shape[1])))
+    factors = [block_factors(pedigree, block) for block in group]
+    width = max(map(len, factors))
+    people = np.zeros((len(group), width), dtype=np.int64)
+    sources = np.zeros((3, len(group), width), dtype=np.int64)
+    founders = np.zeros((len(group), width), dtype=bool)
+    padding = np.ones((len(group), width), dtype=bool)
+    for b, (block, block_people) in enumerate(zip(group, factors)):
+        source = {i: i for i in block_people}
+        source.update({i: n_people + k for k, i in enumerate(block)})
+        for k, person in enumerate(block_people):
+            mother, father = person, person
+            if not pedigree.founders[person]:
+                mother = pedigree.mothers[person]
+                father = pedigree.fathers[person]
+            people[b, k] = person
+            sources[:, b, k] = [source.get(i, i)
+                                for i in (person, mother, father)]
+            founders[b, k] = pedigree.founders[person]
+            padding[b, k] = False
+    return members, states, people, sources, founders, padding
+
+
+def gibbs_chains(people, chains, samples=SAMPLES, burn_in=BURN_IN,
+                 seed=None):
+    """
+    Run `chains` Gibbs sampling chains over the genes of the family in
+    lockstep, each starting from genes drawn from the prior, and return
+    (genes, traits): genes[c, i, g] is the fraction of kept sweeps of
+    chain c in which person i of the pedigree had g genes, and traits[c, i]
+    the chain's average probability of person i having the trait.
+
+    Each sweep updates the blocks of gibbs_blocks a colour at a time (see
+    block_colours), every block of a colour at once. Traits are not
+    sampled: known traits are evidence and unknown ones are averaged given
+    the sampled genes.
+    """
+    pedigree = Pedigree(people)
+    n_people = len(pedigree)
+    rng = np.random.default_rng(seed)
+    with np.errstate(divide="ignore"):
+        log_prior = np.log(pedigree.prior)
+        log_inheritance = np.log(pedigree.inheritance)
+        log_evidence = np.log(pedigree.evidence)
+
+    # Plan an update for the blocks of each size in each colour
+    blocks = gibbs_blocks(pedigree)
+    plans = []
+    for colour in block_colours(pedigree, blocks):
+        for size in (1, 2):
+            group = [blocks[b] for b in colour if len(blocks[b]) == size]
+            if group:
+                plans.append(group_plan(pedigree, group))
+
+    genes = pedigree.sample_genes(rng, chains)
+    gene_counts = np.zeros((chains, n_people, 3))
+    trait_sums = np.zeros((chains, n_people))
+    for sweep in range(burn_in + samples):
+        for members, states, persons, sources, founders, padding in plans:
+
+            # Genes each factor reads, for every chain, block and state of
+            # the block, indexed [chain, child/mother/father, block, state,
+            # factor]
+            from_state = sources >= n_people
+            values = np.where(
+                from_state[:, :, None, :],
+                states[:, np.maximum(sources - n_people, 0)]
+                .transpose(1, 2, 0, 3),
+                genes[:, np.minimum(sources, n_people - 1)][:, :, :, None, :]
+            )
+            child = values[:, 0]
+
+            # Sample each block's state from the product of its factors
+            log_p = np.where(
+                founders[:, None, :],
+                log_prior[child],
+                log_inheritance[values[:, 1], values[:, 2], child]
+            ) + log_evidence[persons[:, None, :], child]
+            log_p = np.where(padding[:, None, :], 0, log_p).sum(axis=-1)
+            weights = np.exp(log_p - log_p.max(axis=-1, keepdims=True))
+            genes[:, members] = states[choose(rng, weights)]
+
+        if sweep >= burn_in:
+            gene_counts += np.eye(3)[genes]
+            trait_sums += pedigree.trait_table[genes, 1]
+    return gene_counts / samples, trait_sums / samples
+
+
+def gelman_rubin(means, samples):
+    """
+    Return the potential scale reduction factor (R-hat) of indicator
+    variables from their means in each of several chains of `samples`
+    samples, the chains along the first axis. Values near 1 suggest the
+    chains have mixed; an indicator constant across every chain gives 1.
+    """
+    within = np.mean(means * (1 - means), axis=0) * samples / (samples - 1)
+    between = np.var(means, axis=0, ddof=1)
+    pooled = (samples - 1) / samples * within + between
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_hat = np.sqrt(pooled / within)
+    r_hat[within == 0] = np.where(between[within == 0] == 0, 1, np.inf)
+    return r_hat
+
+
+def split_work(total, processes):
+    """
+    Return a list splitting `total` units of work as evenly as possible
+    between up to `processes` workers (default: one per CPU).
+    """
+    workers = max(1, min(total, processes or os.cpu_count() or 1))
+    return [total // workers + (k < total % workers) for k in range(workers)]
+
+
+def map_work(function, *iterables):
+    """
+    Return list(map(function, *iterables)), with each call made in its own
+    worker process, unless there is only one call, which is made in this
+    process without starting a pool.
+    """
+    arguments = list(zip(*iterables))
+    if len(arguments) == 1:
+        return [function(*arguments[0])]
+    with ProcessPoolExecutor(len(arguments)) as executor:
+        return list(executor.map(function, *zip(*arguments)))
+
+
+def gibbs_probabilities(people, samples=SAMPLES, burn_in=BURN_IN,
+                        chains=CHAINS, processes=None, seed=None,
+                        diagnostics=None):
+    """
+    Return each person's approximate gene and trait distributions given
+    the known traits, in the form enumerate_probabilities does, by blocked
+    Gibbs sampling (see gibbs_chains). The chains are split between up to
+    `processes` worker processes, and run in this process if that is 1.
+
+    If `diagnostics` is a dictionary, "r_hat" is set to each person's
+    largest R-hat over their gene indicators and "max_r_hat" to the
+    largest of those.
+    """
+    chains = max(2, chains)
+    shares = split_work(chains, processes)
+    seeds = np.random.SeedSequence(seed).spawn(len(shares))
+    results = map_work(
+        gibbs_chains, [people] * len(shares), shares,
+        [samples] * len(shares), [burn_in] * len(shares), seeds
+    )
+    gene_means = np.concatenate([genes for genes, _ in results])
+    trait_means = np.concatenate([traits for _, traits in results])
+
+    pedigree = Pedigree(people)
+    genes = gene_means.mean(axis=0)
+    has_trait = np.where(pedigree.traits >= 0, pedigree.traits,
+                         trait_means.mean(axis=0))
+    if diagnostics is not None:
+        r_hat = gelman_rubin(gene_means, samples).max(axis=1)
+        diagnostics["r_hat"] = dict(zip(pedigree.names, r_hat.tolist()))
+        diagnostics["max_r_hat"] = float(r_hat.max())
+    return pedigree.probabilities(genes, has_trait)
+
+
+def combine_weighted(parts):
+    """
+    Combine (shift, total, genes, traits, squares) sums of weights,
+    weighted gene indicators, weighted trait probabilities and squared
+    weights, each part's weights scaled by exp(-shift), into one with the
+    largest shift.
+    """
+    shift = max(part[0] for part in parts)
+    total = squares = 0
+    genes = traits = 0
+    for part_shift, part_total, part_genes, part_traits, part_squares in parts:
+        scale = np.exp(part_shift - shift)
+        total += scale * part_total
+        genes = genes + scale * part_genes
+        traits = traits + scale * part_traits
+        squares += scale ** 2 * part_squares
+    return shift, total, genes, traits, squares
+
+
+def weighted_samples(people, samples, seed=None):
+    """
+    Draw `samples` assignments of genes from the prior, weighting each by
+    the probability of the known traits given its genes, and return their
+    sums as a combine_weighted part. Weights are kept as logarithms until
+    scaled by their batch's largest, so large families do not underflow.
+    """
+    pedigree = Pedigree(people)
+    rng = np.random.default_rng(seed)
+    with np.errstate(divide="ignore"):
+        log_evidence = np.log(pedigree.evidence)
+    people_index = np.arange(len(pedigree))
+    parts = []
+    for start in range(0, samples, WEIGHTING_BATCH):
+        genes = pedigree.sample_genes(rng, min(WEIGHTING_BATCH,
+                                               samples - start))
+        log_weights = log_evidence[people_index, genes].sum(axis=1)
+        shift = log_weights.max()
+        weights = np.exp(log_weights - shift)
+        parts.append((
+            shift,
+            weights.sum(),
+            np.einsum("k,kig->ig", weights, np.eye(3)[genes]),
+            weights @ pedigree.trait_table[genes, 1],
+            weights @ weights
+        ))
+    return combine_weighted(parts)
+
+
+def likelihood_probabilities(people, samples=SAMPLES * CHAINS,
+                             processes=None, seed=None, diagnostics=None):
+    """
+    Return each person's approximate gene and trait distributions given
+    the known traits, in the form enumerate_probabilities does, by
+    likelihood weighting, with the samples split between up to `processes`
+    worker processes, and drawn in this process if that is 1.
+
+    If `diagnostics` is a dictionary, "effective_samples" is set to the
+    effective sample size of the weights. Evidence that is unlikely under
+    the prior leaves few effective samples, and Gibbs sampling is then the
+    better choice.
+    """
+    shares = split_work(samples, processes)
+    seeds = np.random.SeedSequence(seed).spawn(len(shares))
+    parts = map_work(weighted_samples, [people] * len(shares), shares, seeds)
+    _, total, genes, traits, squares = combine_weighted(parts)
+
+    pedigree = Pedigree(people)
+    has_trait = np.where(pedigree.traits >= 0, pedigree.traits,
+                         traits / total)
+    if diagnostics is not None:
+        diagnostics["effective_samples"] = float(total ** 2 / squares)
+    return pedigree.probabilities(genes / total, has_trait)
+
+
+# Inference methods selectable by name, all taking the people dictionary
+METHODS = {
+    "eliminate": eliminate_probabilities,
+    "enumerate": enumerate_probabilities,
+    "batch": batch_enumerate_probabilities,
+    "gibbs": gibbs_probabilities,
+    "likelihood": likelihood_probabilities
+}
+
+# Methods that sample, and take a diagnostics dictionary
+SAMPLERS = {"gibbs", "likelihood"}
+
+
 if __name__ == "__main__":
     main()
@@ -1,42 +1,85 @@
+import array
+import html.parser
 import os
-import random
-import re
+import pickle
+import posixpath
 import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
 
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Bytes of HTML fed to the link extractor at a time, and files handed to
+# each crawler worker at a time
+CHUNK_SIZE = 1 << 16
+CRAWL_BATCH = 64
+
+# Characters that can never appear in a page name but would break a line of
+# the edge file written by crawl_edges
+UNSAFE_LINK = frozenset("\t\r\n")
+
+# Random surfers moving in parallel, the unrecorded steps each takes to
+# forget its random starting page, and visits counted per bincount
+SURFERS = 1000
+BURN_IN = 50
+VISIT_BATCH = 1 << 22
+
+# Power iteration stops once the L1 change in ranks falls below TOLERANCE
+TOLERANCE = 1e-8
+MAX_ITERATIONS = 1000
+
+# Power iterations between extrapolation steps
+EXTRAPOLATION_PERIOD = 10
+
+# Personalization vectors iterated together by personalized_pagerank
+PERSONALIZATION_BATCH = 256
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
+    if len(sys.argv) not in (2, 3) or (len(sys.argv) == 3
+                                       and sys.argv[2] not in METHODS):
+        sys.exit("Usage: python pagerank.py corpus "
+                 f"[{'|'.join(METHODS)}]")
+    method = sys.argv[2] if len(sys.argv) == 3 else "power"
     corpus = crawl(sys.argv[1])
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
+    residuals = []
+    ranks = iterate_pagerank(corpus, DAMPING, method=method,
+                             callback=lambda i, r: residuals.append(r))
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    if residuals[-1] < TOLERANCE:
+        outcome = "Converged"
+    else:
+        outcome = "Did not converge"
+    print(f"{outcome} by {method} in {len(residuals)} iterations "
+          f"(residual {residuals[-1]:.2e})")
 
 
-def crawl(directory):
+def crawl(directory, processes=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    Subdirectories are crawled too, naming pages by their path relative to
+    `directory`; files are parsed in parallel (see crawl_links).
     """
     pages = dict()
 
     # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    for page, links in crawl_links(directory, processes):
+        pages[page] = links - {page}
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -48,6 +91,132 @@ def crawl(directory):
     return pages
 
 
+class LinkParser(html.parser.HTMLParser):
+    """Incremental HTML parser collecting the href of every <a> tag."""
+
+    def __init__(self):
+        super().__init__()
+        self.links = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            for name, value in attrs:
+                if name == "href" and value:
+                    self.links.add(value)
+
+
+def extract_links(directory, page):
+    """
+    Return the set of pages linked to by `page`, a path relative to
+    `directory`, with links resolved relative to the page's own directory.
+    The file is streamed through the parser a chunk at a time.
+    """
+    parser = LinkParser()
+    with open(os.path.join(directory, page), encoding="utf-8",
+              errors="replace") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            parser.feed(chunk)
+    parser.close()
+    base = posixpath.dirname(page)
+    return {
+        posixpath.normpath(posixpath.join(base, link))
+        for link in parser.links
+    }
+
+
+def find_pages(directory):
+    """
+    Yield the path, relative to `directory` and with / separators, of
+    every .html file in directory and its subdirectories.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        relative = os.path.relpath(root, directory)
+        for filename in sorted(files):
+            if filename.endswith(".html"):
+                if relative == os.curdir:
+                    yield filename
+                else:
+                    yield posixpath.join(*relative.split(os.sep), filename)
+
+
+def crawl_links(directory, processes=None):
+    """
+    Yield (page, links) for every page under `directory`, extracting links
+    from files in parallel in a pool of `processes` worker processes.
+    """
+    pages = list(find_pages(directory))
+    with ProcessPoolExecutor(processes) as executor:
+        results = executor.map(extract_links, [directory] * len(pages),
+                               pages, chunksize=CRAWL_BATCH)
+        yield from zip(pages, results)
+
+
+def crawl_edges(directory, filename, processes=None):
+    """
+    Crawl `directory` as crawl does, writing each link to `filename` as a
+    "page<TAB>link" line as soon as its page is parsed rather than keeping
+    link sets in memory. Links are written unfiltered, except that links
+    containing a tab or line break are skipped: they cannot name a page in
+    the corpus and would break the line format.
+
+    Return the list of pages found.
+    """
+    pages = []
+    with open(filename, "w", encoding="utf-8") as f:
+        for page, links in crawl_links(directory, processes):
+            pages.append(page)
+            f.writelines(f"{page}\t{link}\n" for link in links
+                         if not UNSAFE_LINK.intersection(link))
+    return pages
+
+
+def load_edges(pages, filename):
+    """
+    Return the link matrix (see link_matrix) for `pages` from an edge file
+    written by crawl_edges, reading it a line at a time and dropping links
+    to pages outside the corpus, links from a page to itself and malformed
+    lines.
+    """
+    index = {page: i for i, page in enumerate(pages)}
+    sources = array.array("q")
+    targets = array.array("q")
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t", 1)
+            if len(fields) != 2:
+                continue
+            page, link = fields
+            if page in index and link in index and link != page:
+                sources.append(index[page])
+                targets.append(index[link])
+    links = scipy.sparse.csr_matrix(
+        (np.ones(len(sources)), (np.frombuffer(sources, dtype=np.int64),
+                                 np.frombuffer(targets, dtype=np.int64))),
+        shape=(len(pages), len(pages))
+    )
+
+    # A page linking to another twice still has one link to it
+    links.sum_duplicates()
+    links.data[:] = 1
+    return links
+
+
+def crawl_matrix(directory, filename=None, processes=None):
+    """
+    Return (pages, links) for the corpus under `directory`, as link_matrix
+    does for a crawled corpus, going through an edge file instead of a
+    dictionary of link sets. The edge file is kept at `filename` if given.
+    """
+    if filename is not None:
+        pages = crawl_edges(directory, filename, processes)
+        return pages, load_edges(pages, filename)
+    with tempfile.TemporaryDirectory() as temporary:
+        filename = os.path.join(temporary, "edges.tsv")
+        pages = crawl_edges(directory, filename, processes)
+        return pages, load_edges(pages, filename)
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -77,7 +246,8 @@ def transition_model(corpus, page, damping_factor):
     
     return prob_dist
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, surfers=SURFERS,
+                    burn_in=BURN_IN, seed=None):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
@@ -85,29 +255,67 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    The samples are shared between `surfers` independent random surfers
+    moving in parallel (see random_surf).
     """
-    # Start with a page at random
-    surf_page = random.choice(list(corpus))
-    # pageranks dictionary for all known corpus pages
-    pageranks = dict.fromkeys(corpus.keys(),0)
+    pages, links = link_matrix(corpus)
+    visits = random_surf(links, damping_factor, n, surfers, burn_in, seed)
+    return dict(zip(pages, (visits / n).tolist()))
 
-    # Repeat for n samples
-    for i in range(n):
-        # Count each page hit for n samples
-        pageranks[surf_page] += 1
-        # Generate a sample probability distribution from current page
-        sample = transition_model(corpus, surf_page, damping_factor)
-        # From current page, select new page at random but weighted according to probability distribution
-        weighted_page = random.choices(list(sample), weights = sample.values(), k=1)
-        # Assign list item as current page
-        surf_page = weighted_page[0]
 
-    # Calculate proportion of hits for each page (dictionary comprehension)
-    pageranks = {page: hits/n for page, hits in pageranks.items()}
+def random_surf(links, damping_factor, n, surfers=SURFERS, burn_in=BURN_IN,
+                seed=None):
+    """
+    Return the number of visits to each page over `n` samples taken by
+    `surfers` independent random surfers, each starting at a random page
+    and taking `burn_in` steps before its visits are counted.
+
+    Each step moves every surfer at once: one draw decides between
+    following a link and jumping to a random page, and following a link is
+    a gather from the link matrix's CSR arrays, the links of page i being
+    links.indices[links.indptr[i]:links.indptr[i + 1]].
+    """
+    rng = np.random.default_rng(seed)
+    n_pages = links.shape[0]
+    out_degree = np.diff(links.indptr)
+    surfers = max(1, min(surfers, n))
+
+    visits = np.zeros(n_pages, dtype=np.int64)
+    visited = []
+    pending = 0
+    current = rng.integers(n_pages, size=surfers)
+    remaining = n
+    step = 0
+    while True:
+        # Record where the surfers are, counting visits in large batches
+        taken = current[:remaining] if step >= burn_in else current[:0]
+        step += 1
+        visited.append(taken)
+        pending += len(taken)
+        remaining -= len(taken)
+        if remaining == 0 or pending >= VISIT_BATCH:
+            visits += np.bincount(np.concatenate(visited), minlength=n_pages)
+            visited = []
+            pending = 0
+        if remaining == 0:
+            return visits
+
+        # Follow a random link with probability damping_factor, or jump to
+        # a random page, which pages with no links always do
+        degree = out_degree[current]
+        draw = rng.random(surfers)
+        follow = (draw < damping_factor) & (degree > 0)
+        position = (links.indptr[current[follow]]
+                    + (draw[follow] / damping_factor
+                       * degree[follow]).astype(np.int64))
+        current = rng.integers(n_pages, size=surfers)
+        current[follow] = links.indices[position]
 
-    return pageranks
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=TOLERANCE,
+                     max_iterations=MAX_ITERATIONS, method="power",
+                     callback=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -115,38 +323,427 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    `method` selects the solver from METHODS, and `callback`, if given, is
+    called with each iteration number and its L1 residual.
     """
-    # All page names
-    all_pages = corpus.keys()
-    # Number of pages in corpus
-    n_pages = len(corpus)
-    # Assign each page an initial probability: 1/n_pages
-    pageranks = dict.fromkeys(all_pages, 1/n_pages)
-    # Track changed pagerank
-    delta = dict.fromkeys(all_pages, 1)
-
-    # Iterate until convergence, where all pagerank change < 0.001
-    while any(d > 0.001 for d in delta.values()):
-        # For each page
-        for page in pageranks:
-            prob = 0
-            # Find parent pages to the page
-            for parent_page in corpus:
-                parent_links = corpus[parent_page]
-                # If a parent page has no links, assume a link to every page
-                if not parent_links:
-                    parent_links = all_pages
-                # Sum pagerank of all parent pages/links on parent pages    
-                if page in parent_links:
-                    prob += pageranks[parent_page]/len(parent_links)
-            # Calculate new page rank
-            new_pagerank = ((1 - damping_factor)/n_pages) + (damping_factor * prob)
-            # Store the change in page rank
-            delta[page] = abs(new_pagerank - pageranks[page])
-            # Assign new pagerank to page
-            pageranks[page] = new_pagerank
-
-    return pageranks   
+    pages, links = link_matrix(corpus)
+    ranks = METHODS[method](links, damping_factor, tolerance,
+                            max_iterations, callback=callback)
+    return dict(zip(pages, ranks.tolist()))
+
+
+def link_matrix(corpus):
+    """
+    Return (pages, links) where pages is a list of the pages in corpus
+    and links is a sparse CSR matrix with links[i, j] = 1 if pages[i]
+    links to pages[j].
+    """
+    pages = list(corpus)
+    index = {page: i for i, page in enumerate(pages)}
+    sources = []
+    targets = []
+    for page, page_links in corpus.items():
+        for link in page_links:
+            sources.append(index[page])
+            targets.append(index[link])
+    links = scipy.sparse.csr_matrix(
+        (np.ones(len(sources)), (sources, targets)),
+        shape=(len(pages), len(pages))
+    )
+    return pages, links
+
+
+def transition_matrix(links):
+    """
+    Return (transitions, dangling) for a link matrix, where
+    transitions[i, j] is the probability of following a link from page j
+    to page i (1 / number of links on page j) and dangling marks the pages
+    with no links, which link to every page instead.
+    """
+    out_degree = np.asarray(links.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+    inverse = np.divide(1, out_degree, out=np.zeros(len(out_degree)),
+                        where=~dangling)
+    transitions = scipy.sparse.diags(inverse) @ links
+    return transitions.T.tocsr(), dangling
+
+
+def initial_ranks(n_pages, start=None):
+    """
+    Assign each page an initial probability: 1/n_pages, unless started
+    from earlier ranks.
+    """
+    if start is None:
+        return np.full(n_pages, 1 / n_pages)
+    return np.asarray(start, dtype=float) / np.sum(start)
+
+
+def pagerank_step(transitions, dangling, ranks, damping_factor):
+    """Return the ranks after one step of the random surfer model."""
+    # Rank arriving over links, plus rank spread evenly from dangling
+    # pages and from random jumps
+    spread = (damping_factor * ranks[dangling].sum()
+              + 1 - damping_factor) / len(ranks)
+    return damping_factor * (transitions @ ranks) + spread
+
+
+def power_iteration(links, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, start=None, callback=None):
+    """
+    Return the PageRank vector for a link matrix by power iteration,
+    stopping when the L1 change between iterations is below `tolerance`
+    or after `max_iterations` iterations.
+
+    Iteration starts from the uniform vector, or from `start` if given,
+    e.g. the ranks before a small change to the links. `callback`, if
+    given, is called with each iteration number and its residual.
+    """
+    transitions, dangling = transition_matrix(links)
+    ranks = initial_ranks(links.shape[0], start)
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = pagerank_step(transitions, dangling, ranks, damping_factor)
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if callback is not None:
+            callback(iteration, residual)
+        if residual < tolerance:
+            break
+    return ranks
+
+
+def gauss_seidel(links, damping_factor, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS, start=None, callback=None):
+    """
+    Return the PageRank vector by Gauss-Seidel sweeps, with arguments as
+    for power_iteration.
+
+    PageRank solves (I - d * T) x = b, where T is the transition matrix
+    and b spreads the rank of random jumps and dangling pages evenly.
+    Each sweep solves the lower triangle of I - d * T against b minus the
+    upper triangle times the current ranks, so each page's update already
+    uses the updated ranks of the pages before it. b depends on the
+    dangling pages' rank, so it is taken from the previous sweep and the
+    ranks are renormalized.
+    """
+    n_pages = links.shape[0]
+    transitions, dangling = transition_matrix(links)
+    system = (scipy.sparse.identity(n_pages, format="csr")
+              - damping_factor * transitions)
+    lower = scipy.sparse.tril(system, format="csr")
+    upper = scipy.sparse.triu(system, k=1, format="csr")
+
+    ranks = initial_ranks(n_pages, start)
+    for iteration in range(1, max_iterations + 1):
+        spread = (damping_factor * ranks[dangling].sum()
+                  + 1 - damping_factor) / n_pages
+        new_ranks = scipy.sparse.linalg.spsolve_triangular(
+            lower, spread - upper @ ranks, lower=True
+        )
+        new_ranks /= new_ranks.sum()
+        residual = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if callback is not None:
+            callback(iteration, residual)
+        if residual < tolerance:
+            break
+    return ranks
+
+
+def aitken(history):
+    """
+    Return the componentwise Aitken delta-squared extrapolation of the
+    last three iterates, keeping the latest value wherever the second
+    difference vanishes or the result is not a valid probability.
+    """
+    x2, x1, x0 = history[-3:]
+    second = x0 - 2 * x1 + x2
+    usable = np.abs(second) > 1e-15
+    extrapolated = x0.copy()
+    extrapolated[usable] -= (x0 - x1)[usable] ** 2 / second[usable]
+    invalid = extrapolated <= 0
+    extrapolated[invalid] = x0[invalid]
+    return extrapolated
+
+
+def quadratic(history):
+    """
+    Return the quadratic extrapolation (Kamvar et al.) of the last four
+    iterates, which removes the components along the second and third
+    eigenvectors assuming the iterates are dominated by the first three.
+    """
+    x3, x2, x1, x0 = history[-4:]
+    y = np.column_stack([x2 - x3, x1 - x3])
+    gamma, *_ = np.linalg.lstsq(y, -(x0 - x3), rcond=None)
+    gamma1, gamma2 = gamma
+    extrapolated = ((gamma1 + gamma2 + 1) * x2 + (gamma2 + 1) * x1 + x0)
+    if not np.all(np.isfinite(extrapolated)) or extrapolated.min() < 0:
+        return x0
+    return extrapolated
+
+
+def extrapolated_iteration(links, damping_factor, tolerance=TOLERANCE,
+                           max_iterations=MAX_ITERATIONS, start=None,
+                           callback=None, extrapolate=aitken,
+                           period=EXTRAPOLATION_PERIOD):
+    """
+    Return the PageRank vector by power iteration, trying every `period`
+    iterations an extrapolation (aitken or quadratic) of the latest
+    iterates. Other arguments are as for power_iteration.
+
+    An extrapolation is kept only if a power step from it changes the
+    ranks less than the plain iteration did, in which case that step
+    replaces the plain iterate; otherwise it is discarded.
+    """
+    transitions, dangling = transition_matrix(links)
+    ranks = initial_ranks(links.shape[0], start)
+    history = [ranks]
+    for iteration in range(1, max_iterations + 1):
+        new_ranks = pagerank_step(transitions, dangling, ranks, damping_factor)
+        residual = np.abs(new_ranks - ranks).sum()
+        history = (history + [new_ranks])[-4:]
+        if iteration % period == 0 and len(history) == 4:
+            extrapolated = extrapolate(history)
+            extrapolated = extrapolated / extrapolated.sum()
+            stepped = pagerank_step(transitions, dangling, extrapolated,
+                                    damping_factor)
+            stepped_residual = np.abs(stepped - extrapolated).sum()
+            if stepped_residual < residual:
+                new_ranks, residual = stepped, stepped_residual
+                history = [extrapolated, stepped]
+        ranks = new_ranks
+        if callback is not None:
+            callback(iteration, residual)
+        if residual < tolerance:
+            break
+    return ranks
+
+
+def quadratic_iteration(links, damping_factor, tolerance=TOLERANCE,
+                        max_iterations=MAX_ITERATIONS, start=None,
+                        callback=None):
+    """
+    Return the PageRank vector by power iteration with quadratic
+    extrapolation, with arguments as for power_iteration.
+    """
+    return extrapolated_iteration(links, damping_factor, tolerance,
+                                  max_iterations, start, callback,
+                                  extrapolate=quadratic)
+
+
+def linear_solve(links, damping_factor, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS, start=None, callback=None):
+    """
+    Return the PageRank vector by solving a sparse linear system, with
+    arguments as for power_iteration.
+
+    The rank spread from jumps and dangling pages is the same for every
+    page, so the ranks are proportional to the solution of
+    (I - d * T) x = 1 and only need normalizing. The system is solved by
+    GMRES, since direct factorization of a link graph fills in;
+    `callback` gets GMRES's relative residual norm after each iteration.
+    """
+    n_pages = links.shape[0]
+    transitions, dangling = transition_matrix(links)
+    system = (scipy.sparse.identity(n_pages, format="csr")
+              - damping_factor * transitions)
+    guess = None if start is None else initial_ranks(n_pages, start) * n_pages
+
+    iterations = 0
+
+    def report(residual):
+        nonlocal iterations
+        iterations += 1
+        if callback is not None:
+            callback(iterations, residual)
+
+    ranks, _ = scipy.sparse.linalg.gmres(
+        system, np.ones(n_pages), x0=guess, rtol=tolerance, atol=0,
+        maxiter=max_iterations, callback=report, callback_type="pr_norm"
+    )
+    return ranks / ranks.sum()
+
+
+def teleport_matrix(pages, seed_sets):
+    """
+    Return a dense matrix with one column per seed set, giving the
+    probability of a random jump landing on each of `pages`.
+
+    A seed set is either an iterable of pages, jumped to with equal
+    probability, or a dictionary from pages to weights. Pages outside
+    `pages` are ignored, and a seed set with none left jumps to any page.
+    """
+    index = {page: i for i, page in enumerate(pages)}
+    teleport = np.zeros((len(pages), len(seed_sets)))
+    for column, seeds in enumerate(seed_sets):
+        if not isinstance(seeds, dict):
+            seeds = dict.fromkeys(seeds, 1)
+        for page, weight in seeds.items():
+            if page in index:
+                teleport[index[page], column] += weight
+    teleport[:, teleport.sum(axis=0) == 0] = 1
+    return teleport / teleport.sum(axis=0)
+
+
+def personalized_iteration(links, damping_factor, teleport,
+                           tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS,
+                           callback=None):
+    """
+    Return the personalized PageRank vectors for a link matrix, one column
+    per column of `teleport`, by power iteration on all of them at once.
+
+    Random jumps, and moves from pages with no links, land on a page
+    drawn from the column's teleport distribution instead of uniformly.
+    Each step multiplies the transition matrix by the whole block of
+    ranks, so the matrix is read once per step however many columns
+    there are. Iteration stops once every column's L1 change is below
+    `tolerance`, and `callback`, if given, is called with each iteration
+    number and the largest residual.
+    """
+    transitions, dangling = transition_matrix(links)
+    teleport = np.asarray(teleport, dtype=float)
+    ranks = teleport
+    for iteration in range(1, max_iterations + 1):
+        # Rank arriving over links, plus rank from dangling pages and
+        # random jumps spread by each column's teleport distribution
+        spread = (damping_factor * ranks[dangling].sum(axis=0)
+                  + 1 - damping_factor)
+        new_ranks = damping_factor * (transitions @ ranks)
+        new_ranks += teleport * spread
+        residual = np.abs(new_ranks - ranks).sum(axis=0).max()
+        ranks = new_ranks
+        if callback is not None:
+            callback(iteration, residual)
+        if residual < tolerance:
+            break
+    return ranks
+
+
+def personalized_pagerank(corpus, damping_factor, seed_sets,
+                          tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS,
+                          batch_size=PERSONALIZATION_BATCH):
+    """
+    Return a list of PageRank dictionaries, one for each seed set (see
+    teleport_matrix), in which random jumps only land on the seed pages.
+
+    The seed sets are solved together by personalized_iteration,
+    `batch_size` at a time to bound the memory used by the block of ranks.
+    """
+    pages, links = link_matrix(corpus)
+    results = []
+    for begin in range(0, len(seed_sets), batch_size):
+        teleport = teleport_matrix(pages, seed_sets[begin:begin + batch_size])
+        ranks = personalized_iteration(links, damping_factor, teleport,
+                                       tolerance, max_iterations)
+        results.extend(dict(zip(pages, column)) for column in ranks.T.tolist())
+    return results
+
+
+# Solvers selectable by name, all taking the same arguments
+METHODS = {
+    "power": power_iteration,
+    "gauss-seidel": gauss_seidel,
+    "aitken": extrapolated_iteration,
+    "quadratic": quadratic_iteration,
+    "linear": linear_solve
+}
+
+
+class IncrementalPageRank():
+    """
+    PageRank of a corpus that changes a few pages and links at a time.
+
+    Keeps the link matrix and the last ranks. Each change is applied to
+    the matrix directly, and power iteration restarts from the previous
+    ranks, which are already close to the new ones, so far fewer iterations
+    are needed than when starting from the uniform vector. The state can be
+    saved to a file and loaded again between runs.
+    """
+
+    def __init__(self, corpus, damping_factor=DAMPING, tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS):
+        self.damping_factor = damping_factor
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.pages, self.links = link_matrix(corpus)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+        self.ranks = power_iteration(self.links, damping_factor, tolerance,
+                                     max_iterations)
+
+    def pagerank(self):
+        """Return the current PageRank values as a dictionary."""
+        return dict(zip(self.pages, self.ranks.tolist()))
+
+    def update(self, added_pages=(), removed_pages=(), added_links=(),
+               removed_links=()):
+        """
+        Apply a change to the corpus and return the new PageRank values.
+
+        `added_pages` and `removed_pages` are page names, and
+        `added_links` and `removed_links` are (page, link) pairs. Removing
+        a page removes its links and the links to it. As in crawl, links to
+        pages outside the corpus and from a page to itself are ignored.
+        """
+        links = self.links
+        ranks = self.ranks
+
+        # Drop removed pages' rows and columns, renumbering the rest
+        removed = [self.index[page] for page in set(removed_pages)
+                   if page in self.index]
+        if removed:
+            keep = np.ones(len(self.pages), dtype=bool)
+            keep[removed] = False
+            links = links[keep][:, keep]
+            ranks = ranks[keep]
+            self.pages = [page for page, kept in zip(self.pages, keep)
+                          if kept]
+            self.index = {page: i for i, page in enumerate(self.pages)}
+
+        # Append added pages with no links, starting at rank 1/n
+        for page in added_pages:
+            if page not in self.index:
+                self.index[page] = len(self.pages)
+                self.pages.append(page)
+        n_pages = len(self.pages)
+        if n_pages > links.shape[0]:
+            links = links.copy()
+            links.resize((n_pages, n_pages))
+            ranks = np.concatenate(
+                [ranks, np.full(n_pages - len(ranks), 1 / n_pages)]
+            )
+
+        # Add +1 for each added link and -1 for each removed one, then clip
+        # so that entries stay 0 or 1
+        delta = [(self.index[page], self.index[link], sign)
+                 for pairs, sign in ((added_links, 1), (removed_links, -1))
+                 for page, link in pairs
+                 if page in self.index and link in self.index
+                 and page != link]
+        if delta:
+            sources, targets, signs = zip(*delta)
+            links = links + scipy.sparse.csr_matrix(
+                (signs, (sources, targets)), shape=(n_pages, n_pages)
+            )
+            links.data = np.clip(links.data, 0, 1)
+            links.eliminate_zeros()
+
+        self.links = links.tocsr()
+        self.ranks = power_iteration(self.links, self.damping_factor,
+                                     self.tolerance, self.max_iterations,
+                                     start=ranks)
+        return self.pagerank()
+
+    def save(self, filename):
+        """Save the link matrix and ranks to `filename`."""
+        with open(filename, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a state saved by save."""
+        with open(filename, "rb") as f:
+            return pickle.load(f)
+
 
 if __name__ == "__main__":
     main()
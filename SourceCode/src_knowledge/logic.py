@@ -1,4 +1,12 @@
+import atexit
+import hashlib
 import itertools
+import multiprocessing
+import re
+import shelve
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
 class Sentence():
@@ -15,6 +23,17 @@ class Sentence():
         """Returns a set of all symbols in the logical sentence."""
         return set()
 
+    def reduce(self, model):
+        """
+        Returns the sentence simplified under a partial model: True or False
+        if its value is already fixed, otherwise the residual sentence.
+        """
+        return self
+
+    def polarities(self, positive=True):
+        """Returns a set of (symbol, polarity) pairs occurring in the sentence."""
+        return set()
+
     @classmethod
     def validate(cls, sentence):
         if not isinstance(sentence, Sentence):
@@ -68,6 +87,14 @@ class Symbol(Sentence):
     def symbols(self):
         return {self.name}
 
+    def reduce(self, model):
+        if self.name in model:
+            return bool(model[self.name])
+        return self
+
+    def polarities(self, positive=True):
+        return {(self.name, positive)}
+
 
 class Not(Sentence):
     def __init__(self, operand):
@@ -92,6 +119,12 @@ class Not(Sentence):
     def symbols(self):
         return self.operand.symbols()
 
+    def reduce(self, model):
+        return negate(self.operand.reduce(model))
+
+    def polarities(self, positive=True):
+        return self.operand.polarities(not positive)
+
 
 class And(Sentence):
     def __init__(self, *conjuncts):
@@ -129,6 +162,30 @@ class And(Sentence):
     def symbols(self):
         return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
 
+    def reduce(self, model):
+        conjuncts = []
+        for conjunct in self.conjuncts:
+            conjunct = conjunct.reduce(model)
+            if conjunct is False:
+                return False
+            if conjunct is True:
+                continue
+
+            # Flatten nested conjunctions so unit facts surface at the top
+            if isinstance(conjunct, And):
+                conjuncts.extend(conjunct.conjuncts)
+            else:
+                conjuncts.append(conjunct)
+        if not conjuncts:
+            return True
+        if len(conjuncts) == 1:
+            return conjuncts[0]
+        return And(*conjuncts)
+
+    def polarities(self, positive=True):
+        return set().union(*[conjunct.polarities(positive)
+                             for conjunct in self.conjuncts])
+
 
 class Or(Sentence):
     def __init__(self, *disjuncts):
@@ -160,6 +217,28 @@ class Or(Sentence):
     def symbols(self):
         return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
 
+    def reduce(self, model):
+        disjuncts = []
+        for disjunct in self.disjuncts:
+            disjunct = disjunct.reduce(model)
+            if disjunct is True:
+                return True
+            if disjunct is False:
+                continue
+            if isinstance(disjunct, Or):
+                disjuncts.extend(disjunct.disjuncts)
+            else:
+                disjuncts.append(disjunct)
+        if not disjuncts:
+            return False
+        if len(disjuncts) == 1:
+            return disjuncts[0]
+        return Or(*disjuncts)
+
+    def polarities(self, positive=True):
+        return set().union(*[disjunct.polarities(positive)
+                             for disjunct in self.disjuncts])
+
 
 class Implication(Sentence):
     def __init__(self, antecedent, consequent):
@@ -191,6 +270,21 @@ class Implication(Sentence):
     def symbols(self):
         return set.union(self.antecedent.symbols(), self.consequent.symbols())
 
+    def reduce(self, model):
+        antecedent = self.antecedent.reduce(model)
+        consequent = self.consequent.reduce(model)
+        if antecedent is False or consequent is True:
+            return True
+        if antecedent is True:
+            return consequent
+        if consequent is False:
+            return negate(antecedent)
+        return Implication(antecedent, consequent)
+
+    def polarities(self, positive=True):
+        return set.union(self.antecedent.polarities(not positive),
+                         self.consequent.polarities(positive))
+
 
 class Biconditional(Sentence):
     def __init__(self, left, right):
@@ -217,16 +311,314 @@ class Biconditional(Sentence):
                     and not self.right.evaluate(model)))
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+        left = Sentence.parenthesize(self.left.formula())
+        right = Sentence.parenthesize(self.right.formula())
         return f"{left} <=> {right}"
 
     def symbols(self):
         return set.union(self.left.symbols(), self.right.symbols())
 
-
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+    def reduce(self, model):
+        left = self.left.reduce(model)
+        right = self.right.reduce(model)
+        if isinstance(left, bool) and isinstance(right, bool):
+            return left == right
+        if isinstance(left, bool):
+            return right if left else negate(right)
+        if isinstance(right, bool):
+            return left if right else negate(left)
+        return Biconditional(left, right)
+
+    def polarities(self, positive=True):
+        # Each side occurs both positively and negatively
+        return set().union(self.left.polarities(True),
+                           self.left.polarities(False),
+                           self.right.polarities(True),
+                           self.right.polarities(False))
+
+
+class ParseError(Exception):
+    """Raised when a formula cannot be parsed."""
+
+
+class Parser():
+    """
+    Recursive-descent parser for the syntax produced by Sentence.formula().
+
+    Binding tightest first: ¬, ∧, ∨, => (right-associative) and <=>.
+    Any other run of text is a symbol name, so names containing spaces
+    (which formula() emits in parentheses) are read back unchanged.
+    """
+
+    tokenizer = re.compile(r"(<=>|=>|¬|∧|∨|\(|\))")
+    operators = {"<=>", "=>", "¬", "∧", "∨", "(", ")"}
+
+    def __init__(self, symbols=None):
+        # Symbols are shared across parses so repeated names cost nothing
+        self.symbols = dict() if symbols is None else symbols
+
+    def parse(self, text):
+        """Returns the Sentence represented by text."""
+        self.tokens = [
+            token.strip() for token in self.tokenizer.split(text)
+            if token.strip()
+        ]
+        if not self.tokens:
+            raise ParseError("empty formula")
+        self.position = 0
+        sentence = self.biconditional()
+        if self.position != len(self.tokens):
+            raise ParseError(
+                f"unexpected {self.tokens[self.position]!r} in {text!r}"
+            )
+        return sentence
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def advance(self):
+        token = self.peek()
+        if token is None:
+            raise ParseError("unexpected end of formula")
+        self.position += 1
+        return token
+
+    def biconditional(self):
+        sentence = self.implication()
+        while self.peek() == "<=>":
+            self.advance()
+            sentence = Biconditional(sentence, self.implication())
+        return sentence
+
+    def implication(self):
+        antecedent = self.disjunction()
+        if self.peek() == "=>":
+            self.advance()
+            return Implication(antecedent, self.implication())
+        return antecedent
+
+    def disjunction(self):
+        disjuncts = [self.conjunction()]
+        while self.peek() == "∨":
+            self.advance()
+            disjuncts.append(self.conjunction())
+        return Or(*disjuncts) if len(disjuncts) > 1 else disjuncts[0]
+
+    def conjunction(self):
+        conjuncts = [self.unary()]
+        while self.peek() == "∧":
+            self.advance()
+            conjuncts.append(self.unary())
+        return And(*conjuncts) if len(conjuncts) > 1 else conjuncts[0]
+
+    def unary(self):
+        token = self.advance()
+        if token == "¬":
+            return Not(self.unary())
+        if token == "(":
+            sentence = self.biconditional()
+            if self.advance() != ")":
+                raise ParseError("expected ')'")
+            return sentence
+        if token in self.operators:
+            raise ParseError(f"unexpected {token!r}")
+        if token not in self.symbols:
+            self.symbols[token] = Symbol(token)
+        return self.symbols[token]
+
+
+def parse(text, symbols=None):
+    """Parses a formula such as "¬A ∧ (B => C)" into a Sentence."""
+    return Parser(symbols).parse(text)
+
+
+def iter_sentences(lines, symbols=None):
+    """
+    Parses an iterable of lines, one formula per line, yielding each
+    Sentence in turn. Blank lines and lines starting with # are skipped.
+    """
+    parser = Parser(symbols)
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield parser.parse(line)
+        except ParseError as e:
+            raise ParseError(f"line {number}: {e}") from None
+
+
+def load_knowledge(filename, symbols=None):
+    """
+    Loads a knowledge base file, one formula per line, returning the
+    conjunction of its sentences. The file is read a line at a time.
+    """
+    knowledge = And()
+    with open(filename, encoding="utf-8") as f:
+        for sentence in iter_sentences(f, symbols):
+            knowledge.add(sentence)
+    return knowledge
+
+
+class Stats():
+    """Counters describing the work done by model_check."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.queries = 0
+        self.models = 0
+        self.evaluations = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.query_times = []
+
+    def add(self, models, evaluations):
+        """Adds work done elsewhere, e.g. in a worker process."""
+        self.models += models
+        self.evaluations += evaluations
+
+    def summary(self):
+        """Returns the counters, with derived totals and rates, as a dict."""
+        lookups = self.cache_hits + self.cache_misses
+        total_time = sum(self.query_times)
+        return {
+            "queries": self.queries,
+            "models": self.models,
+            "evaluations": self.evaluations,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "total_time": total_time,
+            "mean_time": total_time / self.queries if self.queries else 0.0,
+            "max_time": max(self.query_times, default=0.0)
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        return "\n".join([
+            f"Queries: {summary['queries']}",
+            f"Models enumerated: {summary['models']}",
+            f"Evaluations: {summary['evaluations']}",
+            f"Cache hits: {summary['cache_hits']} "
+            f"({100 * summary['cache_hit_rate']:.1f}%)",
+            f"Time: {summary['total_time']:.4f}s total, "
+            f"{summary['mean_time']:.6f}s mean, "
+            f"{summary['max_time']:.6f}s max"
+        ])
+
+
+# Counters for this process, and the optional entailment cache
+STATS = Stats()
+cache = None
+
+
+def stats():
+    """Returns the current model_check counters as a dict."""
+    return STATS.summary()
+
+
+def reset_stats():
+    """Resets the model_check counters."""
+    STATS.reset()
+
+
+def enable_cache(filename=None):
+    """
+    Memoizes model_check results, keyed on the canonical form of the
+    knowledge base and query. Results are kept in memory, or persisted
+    across runs in a shelve database if `filename` is given.
+    """
+    global cache
+    disable_cache()
+    if filename is None:
+        cache = dict()
+    else:
+        cache = shelve.open(filename)
+        atexit.register(cache.close)
+
+
+def disable_cache():
+    """Stops memoizing model_check results, closing any cache file."""
+    global cache
+    if isinstance(cache, shelve.Shelf):
+        atexit.unregister(cache.close)
+        cache.close()
+    cache = None
+
+
+def canonical(sentence):
+    """
+    Returns a string representing the sentence, identical for sentences
+    that differ only in the order or repetition of conjuncts and disjuncts.
+    """
+    if isinstance(sentence, Symbol):
+        return repr(sentence.name)
+    if isinstance(sentence, Not):
+        return f"not({canonical(sentence.operand)})"
+    if isinstance(sentence, And):
+        conjuncts = sorted(set(map(canonical, sentence.conjuncts)))
+        return f"and({','.join(conjuncts)})"
+    if isinstance(sentence, Or):
+        disjuncts = sorted(set(map(canonical, sentence.disjuncts)))
+        return f"or({','.join(disjuncts)})"
+    if isinstance(sentence, Implication):
+        antecedent = canonical(sentence.antecedent)
+        consequent = canonical(sentence.consequent)
+        return f"implies({antecedent},{consequent})"
+    if isinstance(sentence, Biconditional):
+        sides = sorted([canonical(sentence.left), canonical(sentence.right)])
+        return f"iff({','.join(sides)})"
+    raise TypeError("must be a logical sentence")
+
+
+def cache_key(knowledge, query):
+    """Returns the cache key for an entailment query."""
+    text = f"{canonical(knowledge)}|={canonical(query)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def model_check(knowledge, query, simplify=True, processes=None, split=None):
+    """
+    Checks if knowledge base entails query, consulting the cache if one
+    is enabled and recording the query in STATS.
+    """
+    start = time.perf_counter()
+    if cache is not None:
+        key = cache_key(knowledge, query)
+        if key in cache:
+            result = cache[key]
+            STATS.cache_hits += 1
+        else:
+            result = entails(knowledge, query, simplify, processes, split)
+            cache[key] = result
+            STATS.cache_misses += 1
+    else:
+        result = entails(knowledge, query, simplify, processes, split)
+    STATS.queries += 1
+    STATS.query_times.append(time.perf_counter() - start)
+    return result
+
+
+def entails(knowledge, query, simplify=True, processes=None, split=None):
+    """
+    Checks if knowledge base entails query.
+
+    With `simplify`, the query is entailed iff knowledge ∧ ¬query
+    is unsatisfiable, which is decided by `satisfiable` after simplifying
+    away every symbol whose value is forced. Otherwise every model over all
+    symbols is enumerated.
+
+    With `processes`, the search for a counter-model is spread over a
+    process pool (see `satisfiable`).
+    """
+    if simplify or processes:
+        return not satisfiable(And(knowledge, Not(query)),
+                               preprocess=simplify,
+                               processes=processes, split=split)
 
     def check_all(knowledge, query, symbols, model):
         """Checks if knowledge base entails query, given a particular model."""
@@ -235,7 +627,10 @@ def model_check(knowledge, query):
         if not symbols:
 
             # If knowledge base is true in model, then query must also be true
+            STATS.models += 1
+            STATS.evaluations += 1
             if knowledge.evaluate(model):
+                STATS.evaluations += 1
                 return query.evaluate(model)
             return True
         else:
@@ -261,3 +656,207 @@ def model_check(knowledge, query):
 
     # Check that knowledge entails query
     return check_all(knowledge, query, symbols, dict())
+
+
+def negate(sentence):
+    """Returns the negation of a sentence or constant, removing double negation."""
+    if isinstance(sentence, bool):
+        return not sentence
+    if isinstance(sentence, Not):
+        return sentence.operand
+    return Not(sentence)
+
+
+def literal(sentence):
+    """
+    Returns (symbol, value) if sentence is a literal fixing one symbol,
+    otherwise None.
+    """
+    if isinstance(sentence, Symbol):
+        return sentence.name, True
+    if isinstance(sentence, Not) and isinstance(sentence.operand, Symbol):
+        return sentence.operand.name, False
+    return None
+
+
+def components(sentence):
+    """
+    Splits a sentence into conjunctions over disjoint sets of symbols.
+    Returns a list of sentences whose conjunction is equivalent to sentence.
+    """
+    if not isinstance(sentence, And):
+        return [sentence]
+
+    # Union-find over symbols, linking the symbols of each conjunct
+    parent = dict()
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for conjunct in sentence.conjuncts:
+        names = list(conjunct.symbols())
+        for name in names:
+            parent.setdefault(name, name)
+        for name in names[1:]:
+            parent[find(name)] = find(names[0])
+
+    # Group conjuncts by the root of their symbols
+    groups = dict()
+    for conjunct in sentence.conjuncts:
+        root = find(next(iter(conjunct.symbols())))
+        groups.setdefault(root, []).append(conjunct)
+    return [And(*conjuncts) if len(conjuncts) > 1 else conjuncts[0]
+            for conjuncts in groups.values()]
+
+
+def simplify(sentence):
+    """
+    Simplifies a sentence while preserving its satisfiability.
+
+    Applies constant folding, unit propagation and pure-literal elimination
+    until nothing changes. Returns a tuple (result, model) where result is
+    True, False, or the residual sentence, and model holds the symbols
+    that were fixed along the way.
+    """
+    model = dict()
+    sentence = sentence.reduce(model)
+    while not isinstance(sentence, bool):
+
+        # Unit propagation: top-level literals fix their symbols outright
+        conjuncts = (sentence.conjuncts if isinstance(sentence, And)
+                     else [sentence])
+        assignment = dict(
+            unit for unit in map(literal, conjuncts) if unit is not None
+        )
+
+        # Pure-literal elimination: a symbol occurring with only one
+        # polarity can take that polarity without losing satisfiability
+        if not assignment:
+            polarities = sentence.polarities()
+            assignment = {
+                name: positive for name, positive in polarities
+                if (name, not positive) not in polarities
+            }
+
+        if not assignment:
+            break
+        model.update(assignment)
+        sentence = sentence.reduce(assignment)
+    return sentence, model
+
+
+def check_any(sentence, symbols, model, stop=None):
+    """
+    Checks if sentence is true in some extension of model that assigns
+    the given symbols. Gives up (returning False) once `stop` is set.
+    """
+
+    # Another worker already found a model (polled every few levels, since
+    # reading the shared event costs more than a node of the search)
+    if stop is not None and len(symbols) % 4 == 0 and stop.is_set():
+        return False
+
+    # If model has an assignment for each symbol
+    if not symbols:
+        STATS.models += 1
+        STATS.evaluations += 1
+        return sentence.evaluate(model)
+
+    # Choose one of the remaining unused symbols
+    remaining = symbols.copy()
+    p = remaining.pop()
+
+    # Try the model where the symbol is true, then where it is false
+    model_true = model.copy()
+    model_true[p] = True
+    if check_any(sentence, remaining, model_true, stop):
+        return True
+    model_false = model.copy()
+    model_false[p] = False
+    return check_any(sentence, remaining, model_false, stop)
+
+
+# Event shared by the workers of a parallel search, set by `init_worker`
+worker_stop = None
+
+
+def init_worker(stop):
+    """Stores the pool's stop event in a worker process."""
+    global worker_stop
+    worker_stop = stop
+
+
+def check_subtree(sentence, symbols, model):
+    """
+    Runs `check_any` in a worker, giving up once any worker succeeds.
+    Returns the result with the models and evaluations it took.
+    """
+    STATS.reset()
+    found = check_any(sentence, symbols, model, worker_stop)
+    return found, STATS.models, STATS.evaluations
+
+
+def parallel_check_any(sentence, symbols, processes, split=None):
+    """
+    Checks if sentence is true in some model over symbols, using a pool
+    of `processes` workers.
+
+    The first `split` symbols are fixed in each of the 2^split ways and
+    each resulting subtree is searched by a worker. As soon as one worker
+    finds a model, all others are told to stop.
+    """
+    symbols = sorted(symbols)
+    if split is None:
+        # A few subtrees per worker keeps the pool busy
+        split = max(1, processes - 1).bit_length() + 2
+    split = min(split, len(symbols))
+    fixed, remaining = symbols[:split], set(symbols[split:])
+
+    stop = multiprocessing.Event()
+    executor = ProcessPoolExecutor(processes, initializer=init_worker,
+                                   initargs=(stop,))
+    try:
+        futures = [
+            executor.submit(check_subtree, sentence, remaining,
+                            dict(zip(fixed, values)))
+            for values in itertools.product((True, False), repeat=split)
+        ]
+        for future in as_completed(futures):
+            found, models, evaluations = future.result()
+            STATS.add(models, evaluations)
+            if found:
+                stop.set()
+                return True
+        return False
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def satisfiable(sentence, preprocess=True, processes=None, split=None):
+    """
+    Checks if some model makes the sentence true.
+
+    With `preprocess`, forced symbols are eliminated first and independent
+    components are enumerated separately. With `processes`, enumeration
+    is parallelised as in `parallel_check_any`.
+    """
+    if preprocess:
+        sentence, _ = simplify(sentence)
+        if isinstance(sentence, bool):
+            return sentence
+        parts = components(sentence)
+    else:
+        parts = [sentence]
+
+    # Independent components can be enumerated separately
+    for part in parts:
+        if processes:
+            found = parallel_check_any(part, part.symbols(), processes, split)
+        else:
+            found = check_any(part, part.symbols(), dict())
+        if not found:
+            return False
+    return True
@@ -1,3 +1,5 @@
+import sys
+
 from logic import *
 
 people = ["Gilderoy", "Pomona", "Minerva", "Horace"]
@@ -53,3 +55,7 @@ knowledge.add(
 for symbol in symbols:
     if model_check(knowledge, symbol):
         print(symbol)
+
+# Report the work model_check did
+if "--stats" in sys.argv:
+    print(STATS)
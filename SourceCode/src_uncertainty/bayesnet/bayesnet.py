@@ -0,0 +1,432 @@
+import itertools
+import random
+
+import numpy as np
+
+# Samples drawn at a time, bounding the memory used by sampling
+SAMPLE_BATCH = 1 << 20
+
+
+class DiscreteDistribution():
+    """
+    Distribution over a finite set of values, given as a dictionary from
+    each value to its probability.
+    """
+
+    def __init__(self, parameters):
+        self.parameters = [dict(parameters)]
+        self.values = list(parameters)
+        self.table = np.array(list(parameters.values()), dtype=float)
+
+    def __repr__(self):
+        return f"DiscreteDistribution({self.parameters[0]})"
+
+    def keys(self):
+        """Returns the list of values of the distribution."""
+        return list(self.values)
+
+    def probability(self, value):
+        """Returns the probability of `value`."""
+        return self.parameters[0].get(value, 0.0)
+
+    def sample(self, n=None):
+        """Returns a value drawn from the distribution, or a list of `n`."""
+        values = random.choices(self.values, weights=self.table,
+                                k=1 if n is None else n)
+        return values[0] if n is None else values
+
+
+class ConditionalProbabilityTable():
+    """
+    Distribution over a finite set of values conditional on the values of
+    parent distributions.
+
+    The table is a list of rows, each the value of every parent in the
+    order of `parents`, then a value of this distribution, then its
+    probability given those parent values. Rows left out have probability
+    0. The probabilities are kept as an array indexed by the index of each
+    parent's value among that parent's keys(), then of this distribution's
+    value among its own keys().
+    """
+
+    def __init__(self, table, parents):
+        self.parents = list(parents)
+        self.values = list(dict.fromkeys(row[-2] for row in table))
+        indices = [{value: i for i, value in enumerate(parent.keys())}
+                   for parent in self.parents]
+        indices.append({value: i for i, value in enumerate(self.values)})
+        self.table = np.zeros([len(index) for index in indices])
+        for row in table:
+            if len(row) != len(self.parents) + 2:
+                raise ValueError(f"row {row} does not match the parents")
+            position = tuple(index[value]
+                             for index, value in zip(indices, row[:-1]))
+            self.table[position] = row[-1]
+
+    def __repr__(self):
+        return f"ConditionalProbabilityTable({self.values}, " \
+               f"{len(self.parents)} parents)"
+
+    def keys(self):
+        """Returns the list of values of the distribution."""
+        return list(self.values)
+
+    def probability(self, value, parent_values):
+        """
+        Returns the probability of `value` given `parent_values`, a
+        dictionary from each parent distribution to its value.
+        """
+        position = tuple(parent.keys().index(parent_values[parent])
+                         for parent in self.parents)
+        return float(self.table[position][self.values.index(value)])
+
+    def sample(self, parent_values):
+        """
+        Returns a value drawn given `parent_values`, a dictionary from
+        each parent distribution to its value.
+        """
+        position = tuple(parent.keys().index(parent_values[parent])
+                         for parent in self.parents)
+        return random.choices(self.values, weights=self.table[position])[0]
+
+
+class Node():
+    """Named random variable of a Bayesian network with its distribution."""
+
+    def __init__(self, distribution, name=None):
+        self.distribution = distribution
+        self.name = name
+
+    def __repr__(self):
+        return f"Node({self.name!r})"
+
+
+class BayesianNetwork():
+    """
+    Bayesian network over discrete random variables.
+
+    States are added with add_states and connected with add_edge, and the
+    network is compiled by bake. Values are then handled as indices:
+    node i takes values states[i].distribution.keys(), and its table is
+    indexed by its parents' value indices and then its own.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.states = []
+        self.edges = []
+        self.baked = False
+
+    def add_state(self, state):
+        """Adds a node to the network."""
+        self.states.append(state)
+        self.baked = False
+
+    def add_node(self, state):
+        """Adds a node to the network."""
+        self.add_state(state)
+
+    def add_states(self, *states):
+        """Adds nodes to the network."""
+        for state in states:
+            self.add_state(state)
+
+    def add_edge(self, parent, child):
+        """Adds an edge from node `parent` to node `child`."""
+        self.edges.append((parent, child))
+        self.baked = False
+
+    def bake(self):
+        """
+        Compiles the network, checking that the edges agree with each
+        node's conditional probability table, and orders the nodes
+        topologically for sampling.
+        """
+        index = {state.distribution: i for i, state in enumerate(self.states)}
+        self.parents = []
+        for state in self.states:
+            parents = getattr(state.distribution, "parents", [])
+            for parent in parents:
+                if parent not in index:
+                    raise ValueError(
+                        f"parent of {state.name} is not in the network"
+                    )
+            self.parents.append([index[parent] for parent in parents])
+        edges = {(self.states.index(parent), self.states.index(child))
+                 for parent, child in self.edges}
+        expected = {(parent, child)
+                    for child, parents in enumerate(self.parents)
+                    for parent in parents}
+        if edges != expected:
+            raise ValueError("edges do not match the conditional "
+                             "probability tables")
+
+        self.values = [state.distribution.keys() for state in self.states]
+        self.value_index = [{value: i for i, value in enumerate(values)}
+                            for values in self.values]
+        self.tables = [state.distribution.table for state in self.states]
+        self.cumulative = [np.cumsum(table, axis=-1) for table in self.tables]
+
+        # Order nodes so that every node comes after its parents
+        self.order = []
+        placed = set()
+        while len(self.order) < len(self.states):
+            ready = [i for i in range(len(self.states)) if i not in placed
+                     and placed.issuperset(self.parents[i])]
+            if not ready:
+                raise ValueError("network has a cycle")
+            self.order.extend(ready)
+            placed.update(ready)
+
+        self.elimination_orders = dict()
+        self.baked = True
+
+    def check_baked(self):
+        if not self.baked:
+            raise Exception("network must be baked first")
+
+    def encode(self, X):
+        """
+        Returns an array of value indices for rows of values given in the
+        order of states, or as dictionaries from node names to values.
+        Missing values (None, or names left out) are encoded as -1.
+        """
+        rows = np.full((len(X), len(self.states)), -1, dtype=np.int64)
+        names = {state.name: i for i, state in enumerate(self.states)}
+        for r, row in enumerate(X):
+            if isinstance(row, dict):
+                row = [row.get(state.name) for state in self.states]
+                unknown = set(X[r]) - set(names)
+                if unknown:
+                    raise ValueError(f"unknown nodes {unknown}")
+            if len(row) != len(self.states):
+                raise ValueError(f"row {row} does not match the states")
+            for i, value in enumerate(row):
+                if value is not None:
+                    if value not in self.value_index[i]:
+                        raise ValueError(f"{value!r} is not a value of "
+                                         f"{self.states[i].name}")
+                    rows[r, i] = self.value_index[i][value]
+        return rows
+
+    def probability(self, X):
+        """
+        Returns the joint probability of a full assignment of values to
+        every node, given as a list in the order of states, or an array of
+        probabilities for a list of such assignments.
+        """
+        self.check_baked()
+        single = not isinstance(X[0], (list, tuple, dict))
+        rows = self.encode([X] if single else X)
+        if (rows < 0).any():
+            raise ValueError("every node must have a value")
+
+        # Multiply each node's entry for its parents' and its own values
+        p = np.ones(len(rows))
+        for i, table in enumerate(self.tables):
+            position = tuple(rows[:, parent] for parent in self.parents[i])
+            p *= table[position + (rows[:, i],)]
+        return float(p[0]) if single else p
+
+    def factors(self):
+        """
+        Returns the conditional probability tables as (scope, table)
+        factors, scope being a tuple of node indices with the node last.
+        """
+        return [(tuple(self.parents[i]) + (i,), table)
+                for i, table in enumerate(self.tables)]
+
+    def elimination_order(self, target):
+        """
+        Returns an order for eliminating every node but `target`, choosing
+        at each step the node with the fewest neighbours in the moral
+        graph. Evidence only adds factors over single nodes, so one order
+        serves every query.
+        """
+        if target in self.elimination_orders:
+            return self.elimination_orders[target]
+        neighbours = {i: set() for i in range(len(self.states))}
+        for scope, _ in self.factors():
+            for i in scope:
+                neighbours[i].update(scope)
+        for i in neighbours:
+            neighbours[i].discard(i)
+
+        order = []
+        remaining = set(neighbours) - {target}
+        while remaining:
+            node = min(remaining, key=lambda i: (len(neighbours[i]), i))
+            remaining.discard(node)
+            order.append(node)
+            adjacent = neighbours.pop(node)
+            for i in adjacent:
+                neighbours[i].discard(node)
+                neighbours[i].update(adjacent - {i})
+        self.elimination_orders[target] = order
+        return order
+
+    def marginals(self, rows, target):
+        """
+        Returns an array whose row b is the distribution of node `target`
+        given the observed values in row b of `rows` (see encode), by
+        variable elimination over every row at once.
+
+        Each factor has a leading batch axis: 1 for the probability tables,
+        shared by every row, and one entry per row for the evidence, an
+        indicator of each observed value.
+        """
+        factors = [(scope, table[np.newaxis])
+                   for scope, table in self.factors()]
+        for i in range(len(self.states)):
+            observed = rows[:, i] >= 0
+            if observed.any():
+                indicator = np.ones((len(rows), len(self.values[i])))
+                indicator[observed] = np.eye(len(self.values[i]))[
+                    rows[observed, i]
+                ]
+                factors.append(((i,), indicator))
+
+        # Sum out each other node from the product of factors mentioning it
+        for node in self.elimination_order(target):
+            mentioning = [factor for factor in factors if node in factor[0]]
+            factors = [factor for factor in factors
+                       if node not in factor[0]]
+            scope = tuple(sorted(
+                set(itertools.chain.from_iterable(
+                    variables for variables, _ in mentioning
+                )) - {node}
+            ))
+            factors.append(combine(mentioning, scope))
+
+        _, table = combine(factors, (target,))
+        table = np.broadcast_to(table, (len(rows), table.shape[-1]))
+        with np.errstate(invalid="ignore"):
+            return table / table.sum(axis=1, keepdims=True)
+
+    def draw(self, n, rng, fixed=None):
+        """
+        Returns (rows, weights) for `n` samples drawn with `rng` by
+        ancestral sampling, rows holding value indices as encode does.
+
+        Each node is drawn after its parents, for every sample at once, by
+        finding a uniform draw's place in the node's cumulative table at
+        its parents' values. Nodes with an index in `fixed` (as from
+        encode, -1 for free nodes) are set to it instead, and weights are
+        the product of their probabilities given their parents.
+        """
+        rows = np.empty((n, len(self.states)), dtype=np.int64)
+        weights = np.ones(n)
+        for i in self.order:
+            position = tuple(rows[:, parent] for parent in self.parents[i])
+            if fixed is not None and fixed[i] >= 0:
+                rows[:, i] = fixed[i]
+                weights *= self.tables[i][position + (fixed[i],)]
+                continue
+            if position:
+                cumulative = self.cumulative[i][position]
+            else:
+                cumulative = np.broadcast_to(self.cumulative[i],
+                                             (n, len(self.values[i])))
+            draws = rng.random(n) * cumulative[:, -1]
+            rows[:, i] = np.minimum(
+                (cumulative < draws[:, np.newaxis]).sum(axis=1),
+                len(self.values[i]) - 1
+            )
+        return rows, weights
+
+    def decode(self, rows):
+        """Returns an array of the values encoded as indices in `rows`."""
+        decoded = np.empty(rows.shape, dtype=object)
+        for i, values in enumerate(self.values):
+            decoded[:, i] = np.array(values, dtype=object)[rows[:, i]]
+        return decoded
+
+    def sample(self, n=1, random_state=None):
+        """
+        Returns an array of `n` joint samples, one row of values per
+        sample in the order of states.
+        """
+        self.check_baked()
+        rng = np.random.default_rng(random_state)
+        rows = [self.draw(min(SAMPLE_BATCH, n - start), rng)[0]
+                for start in range(0, n, SAMPLE_BATCH)]
+        return self.decode(np.concatenate(rows))
+
+    def rejection_sample(self, evidence, n, random_state=None):
+        """
+        Draws `n` joint samples and returns an array of those agreeing
+        with `evidence`, a dictionary from node names to observed values.
+        """
+        self.check_baked()
+        rng = np.random.default_rng(random_state)
+        observed = self.encode([evidence])[0]
+        known = observed >= 0
+        accepted = []
+        for start in range(0, n, SAMPLE_BATCH):
+            rows, _ = self.draw(min(SAMPLE_BATCH, n - start), rng)
+            matches = (rows[:, known] == observed[known]).all(axis=1)
+            accepted.append(rows[matches])
+        return self.decode(np.concatenate(accepted))
+
+    def likelihood_weighting(self, evidence, n, random_state=None):
+        """
+        Returns (samples, weights) for `n` samples with the nodes in
+        `evidence`, a dictionary from node names to observed values, fixed
+        to their values and the rest drawn given their parents. Each
+        sample's weight is the probability of the evidence given its
+        parents in that sample, so no sample is wasted.
+        """
+        self.check_baked()
+        rng = np.random.default_rng(random_state)
+        observed = self.encode([evidence])[0]
+        samples = []
+        weights = []
+        for start in range(0, n, SAMPLE_BATCH):
+            rows, row_weights = self.draw(min(SAMPLE_BATCH, n - start), rng,
+                                          fixed=observed)
+            samples.append(rows)
+            weights.append(row_weights)
+        return self.decode(np.concatenate(samples)), np.concatenate(weights)
+
+    def predict_proba(self, X):
+        """
+        Returns, for evidence given as a dictionary from node names to
+        observed values, a list with, for each node in the order of
+        states, its observed value or a DiscreteDistribution over its
+        values given the evidence.
+
+        Given a list of evidence, as dictionaries or as rows in the order
+        of states with None for unobserved nodes, returns a list of such
+        lists. The queries are answered together, one elimination per
+        node for all the rows with that node unobserved.
+        """
+        self.check_baked()
+        single = isinstance(X, dict)
+        rows = self.encode([X] if single else X)
+        predictions = [[None] * len(self.states) for _ in rows]
+        for i, state in enumerate(self.states):
+            unobserved = np.flatnonzero(rows[:, i] < 0)
+            if len(unobserved):
+                distributions = self.marginals(rows[unobserved], i)
+                for r, distribution in zip(unobserved, distributions):
+                    predictions[r][i] = DiscreteDistribution(
+                        dict(zip(self.values[i], distribution.tolist()))
+                    )
+            for r in np.flatnonzero(rows[:, i] >= 0):
+                predictions[r][i] = self.values[i][rows[r, i]]
+        return predictions[0] if single else predictions
+
+
+def combine(factors, scope):
+    """
+    Multiplies (scope, table) factors whose tables have a leading batch
+    axis, summing out every variable not in `scope`.
+    """
+    labels = dict()
+    operands = []
+    for variables, table in factors:
+        operands.append(table)
+        operands.append([0] + [labels.setdefault(v, len(labels) + 1)
+                               for v in variables])
+    output = [0] + [labels[v] for v in scope]
+    return scope, np.einsum(*operands, output)
@@ -1,4 +1,4 @@
-from pomegranate import *
+from bayesnet import *
 
 # Rain node has no parents
 rain = Node(DiscreteDistribution({
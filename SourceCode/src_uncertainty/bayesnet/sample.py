@@ -1,41 +1,22 @@
-import pomegranate
-
 from collections import Counter
 
-from model import model
-
-def generate_sample():
-
-    # Mapping of random variable name to sample generated
-    sample = {}
-
-    # Mapping of distribution to sample generated
-    parents = {}
+import numpy as np
 
-    # Loop over all states, assuming topological order
-    for state in model.states:
-
-        # If we have a non-root node, sample conditional on parents
-        if isinstance(state.distribution, pomegranate.ConditionalProbabilityTable):
-            sample[state.name] = state.distribution.sample(parent_values=parents)
-
-        # Otherwise, just sample from the distribution alone
-        else:
-            sample[state.name] = state.distribution.sample()
-
-        # Keep track of the sampled value in the parents mapping
-        parents[state.distribution] = sample[state.name]
+from model import model
 
-    # Return generated sample
-    return sample
+# Column of the samples holding each node's value
+columns = {state.name: i for i, state in enumerate(model.states)}
 
 # Rejection sampling
 # Compute distribution of Appointment given that train is delayed
-N = 10000
-data = []
-for i in range(N):
-    sample = generate_sample()
-    if sample["train"] == "delayed":
-        data.append(sample["appointment"])
-print(Counter(data))
-
+N = 1000000
+samples = model.rejection_sample({"train": "delayed"}, N)
+print(Counter(samples[:, columns["appointment"]]))
+
+# Likelihood weighting
+# Fix train as delayed and weight each sample by how likely that was
+samples, weights = model.likelihood_weighting({"train": "delayed"}, N)
+values, inverse = np.unique(samples[:, columns["appointment"]],
+                            return_inverse=True)
+totals = np.bincount(inverse, weights=weights) / weights.sum()
+print(dict(zip(values, totals.tolist())))
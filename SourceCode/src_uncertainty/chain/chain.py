@@ -0,0 +1,268 @@
+import numpy as np
+
+# States of a single trajectory followed at a time (steps times number of
+# states), its steps split into blocks of TRAJECTORY_BLOCK steps
+TRAJECTORY_BATCH = 1 << 23
+TRAJECTORY_BLOCK = 1 << 11
+
+
+class DiscreteDistribution():
+    """
+    Distribution over a finite set of values, given as a dictionary from
+    each value to its probability.
+    """
+
+    def __init__(self, parameters):
+        self.parameters = [dict(parameters)]
+
+    def __repr__(self):
+        return f"DiscreteDistribution({self.parameters[0]})"
+
+    def keys(self):
+        """Returns the list of values of the distribution."""
+        return list(self.parameters[0])
+
+
+class ConditionalProbabilityTable():
+    """
+    Distribution over a finite set of values conditional on the value of
+    a parent distribution, given as a list of [parent value, value,
+    probability] rows.
+    """
+
+    def __init__(self, table, parents):
+        self.table = [list(row) for row in table]
+        self.parents = list(parents)
+
+    def __repr__(self):
+        return f"ConditionalProbabilityTable({len(self.table)} rows)"
+
+
+class MarkovChain():
+    """
+    Markov chain over a finite set of states, held as a transition matrix
+    whose row s is the distribution of the next state after state s.
+
+    Each row also has an alias table (see alias_table), so a step from
+    any state costs one uniform integer, one uniform float and two
+    lookups, for every chain or block of steps at once.
+    """
+
+    def __init__(self, distributions):
+        start, transitions = distributions
+        self.states = start.keys()
+        index = {state: i for i, state in enumerate(self.states)}
+        matrix = np.zeros((len(self.states), len(self.states)))
+        for previous, following, p in transitions.table:
+            if previous not in index or following not in index:
+                raise ValueError(f"unknown state in row "
+                                 f"{[previous, following, p]}")
+            matrix[index[previous], index[following]] = p
+        starts = [start.parameters[0][state] for state in self.states]
+        self.compile(matrix, starts)
+
+    @classmethod
+    def from_matrix(cls, matrix, states=None, starts=None):
+        """
+        Returns a chain moving between `states` (default: 0, 1, ...) as in
+        `matrix`, starting in each with the probability in `starts`
+        (default: uniformly).
+        """
+        chain = cls.__new__(cls)
+        matrix = np.asarray(matrix, dtype=float)
+        chain.states = list(range(len(matrix)) if states is None else states)
+        if starts is None:
+            starts = np.full(len(matrix), 1 / len(matrix))
+        chain.compile(matrix, starts)
+        return chain
+
+    def compile(self, matrix, starts):
+        """Checks and stores the transition matrix and start distribution."""
+        n_states = len(self.states)
+        starts = np.asarray(starts, dtype=float)
+        if matrix.shape != (n_states, n_states) or starts.shape != (n_states,):
+            raise ValueError("transitions and starts must match the states")
+        if not np.allclose(matrix.sum(axis=1), 1):
+            raise ValueError("each row of transitions must sum to 1")
+        self.matrix = matrix / matrix.sum(axis=1, keepdims=True)
+        self.starts = starts / starts.sum()
+        self.start_alias = alias_table(self.starts)
+        self.alias = alias_table(self.matrix)
+
+        # Flat tables for step, entry 2 * (s * n + k) + kept of outcomes
+        # being where column k of row s leads, and thresholds holding
+        # keep[s, k] at both entries
+        keep, alias = self.alias
+        self.thresholds = np.repeat(keep.ravel(), 2)
+        self.outcomes = np.stack([alias, np.broadcast_to(
+            np.arange(n_states), alias.shape)], axis=-1).ravel()
+        self.dtype = np.min_scalar_type(max(0, n_states - 1))
+
+    def step(self, current, columns, draws):
+        """
+        Returns the states after one step from the states `current`, given
+        a uniform column and a uniform draw in [0, 1) per state. Whether
+        the column is kept is added to the index of a single lookup rather
+        than chosen between with np.where, which costs more.
+        """
+        index = current * (2 * len(self.states)) + 2 * columns
+        index += draws < self.thresholds.take(index)
+        return self.outcomes.take(index)
+
+    def start(self, rng, size):
+        """Returns `size` states drawn from the start distribution."""
+        keep, alias = self.start_alias
+        columns = rng.integers(len(self.states), size=size)
+        return np.where(rng.random(size) < keep[columns], columns,
+                        alias[columns])
+
+    def sample_chains(self, chains, length, start=None, random_state=None):
+        """
+        Returns an array of `chains` independent trajectories of `length`
+        states as state indices, one row per chain, each starting from a
+        state drawn from the start distribution, or from the state with
+        index `start`. Every step moves all the chains at once.
+        """
+        rng = np.random.default_rng(random_state)
+        paths = np.empty((chains, length), dtype=self.dtype)
+        if not length:
+            return paths
+        if start is None:
+            paths[:, 0] = self.start(rng, chains)
+        else:
+            paths[:, 0] = start
+        current = paths[:, 0].astype(np.intp)
+        for t in range(1, length):
+            current = self.step(current,
+                                rng.integers(len(self.states), size=chains),
+                                rng.random(chains))
+            paths[:, t] = current
+        return paths
+
+    def trajectory(self, length, start=None, random_state=None):
+        """
+        Returns one trajectory of `length` states as an array of state
+        indices, starting as sample_chains does.
+
+        Each step is a random map from states to states, drawn once per
+        step from shared uniforms, so the steps can be drawn before the
+        states are known. The steps are cut into blocks, and a single pass
+        follows every block from every possible starting state at once,
+        composing the block's maps on the way. A short walk over the
+        composed maps then gives the state at the start of each block,
+        which picks the block's path. The Python loops run over the steps
+        of one block and over the blocks, not over every step.
+        """
+        rng = np.random.default_rng(random_state)
+        n_states = len(self.states)
+        path = np.empty(length, dtype=self.dtype)
+        if not length:
+            return path
+        state = self.start(rng, 1)[0] if start is None else start
+
+        # Each batch follows every state through its steps, so holds
+        # TRAJECTORY_BATCH states whatever the number of states
+        batch = max(TRAJECTORY_BLOCK, TRAJECTORY_BATCH // n_states)
+        for offset in range(0, length, batch):
+            steps = min(batch, length - offset)
+            block = min(TRAJECTORY_BLOCK, steps)
+            blocks = -(-steps // block)
+
+            # Uniforms of every step, by step within a block and then by
+            # block; steps past the end are never used
+            columns = rng.integers(n_states, size=(block, blocks))
+            draws = rng.random((block, blocks))
+
+            # Follow each block from every state at its first step,
+            # paths[:, s, b] being block b's path from state s, until
+            # maps[s, b] is where the chain is after the block
+            paths = np.empty((block, n_states, blocks), dtype=self.dtype)
+            maps = np.repeat(np.arange(n_states)[:, np.newaxis], blocks,
+                             axis=1)
+            for j in range(block):
+                paths[j] = maps
+                maps = self.step(maps, columns[j], draws[j])
+
+            # Walk from block to block for the state at each block's start,
+            # and keep the path of each block from that state
+            starts = np.empty(blocks, dtype=np.intp)
+            for b, row in enumerate(maps.T.tolist()):
+                starts[b] = state
+                state = row[state]
+            chosen = paths[:, starts, np.arange(blocks)].T
+            path[offset:offset + steps] = chosen.ravel()[:steps]
+
+            # The next batch continues from the step after the last one
+            if steps % block:
+                last = steps % block - 1
+                state = self.step(np.intp(chosen[-1, last]),
+                                  columns[last, -1], draws[last, -1])
+        return path
+
+    def sample(self, length, random_state=None):
+        """Returns a list of `length` states of one trajectory."""
+        return [self.states[i]
+                for i in self.trajectory(length, random_state=random_state)]
+
+    def stationary(self):
+        """
+        Returns the stationary distribution, solving pi P = pi with the
+        entries of pi summing to 1. If the chain has more than one, as
+        when it is reducible, returns the eigenvector of eigenvalue 1
+        found by an eigendecomposition.
+        """
+        n_states = len(self.states)
+        system = self.matrix.T - np.eye(n_states)
+        system[-1] = 1
+        target = np.zeros(n_states)
+        target[-1] = 1
+        try:
+            return np.linalg.solve(system, target)
+        except np.linalg.LinAlgError:
+            values, vectors = np.linalg.eig(self.matrix.T)
+            vector = np.real(vectors[:, np.argmin(np.abs(values - 1))])
+            return vector / vector.sum()
+
+    def n_step(self, n):
+        """
+        Returns the n-step transition matrix, computed by repeated
+        squaring.
+        """
+        return np.linalg.matrix_power(self.matrix, n)
+
+    def distribution(self, n, start=None):
+        """
+        Returns the distribution over states after n steps from the start
+        distribution, or from `start`, a distribution over states.
+        """
+        start = self.starts if start is None else np.asarray(start)
+        return start @ self.n_step(n)
+
+
+def alias_table(probabilities):
+    """
+    Returns (keep, alias) arrays for drawing from each row of
+    `probabilities`, a distribution or a matrix of them, by Vose's alias
+    method: draw a column k uniformly, then keep k with probability
+    keep[..., k] or take alias[..., k].
+    """
+    probabilities = np.asarray(probabilities, dtype=float)
+    rows = probabilities.reshape(-1, probabilities.shape[-1])
+    n = rows.shape[1]
+    keep = np.ones(rows.shape)
+    alias = np.tile(np.arange(n), (len(rows), 1))
+    for r, row in enumerate(rows):
+        scaled = row * n / row.sum()
+        small = [k for k in range(n) if scaled[k] < 1]
+        large = [k for k in range(n) if scaled[k] >= 1]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            keep[r, less] = scaled[less]
+            alias[r, less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+    return keep.reshape(probabilities.shape), alias.reshape(probabilities.shape)
@@ -1,4 +1,4 @@
-from pomegranate import *
+from chain import *
 
 # Define starting probabilities
 start = DiscreteDistribution({
@@ -19,3 +19,6 @@ model = MarkovChain([start, transitions])
 
 # Sample 50 states from chain
 print(model.sample(50))
+
+# Long-run share of each state
+print(dict(zip(model.states, model.stationary().round(4).tolist())))
@@ -0,0 +1,411 @@
+import collections
+
+import numpy as np
+
+
+class DiscreteDistribution():
+    """
+    Distribution over a finite set of values, given as a dictionary from
+    each value to its probability.
+    """
+
+    def __init__(self, parameters):
+        self.parameters = [dict(parameters)]
+
+    def __repr__(self):
+        return f"DiscreteDistribution({self.parameters[0]})"
+
+    def keys(self):
+        """Returns the list of values of the distribution."""
+        return list(self.parameters[0])
+
+    def probability(self, value):
+        """Returns the probability of `value`."""
+        return self.parameters[0].get(value, 0.0)
+
+
+class State():
+    """Hidden state of a Markov model with its emission distribution."""
+
+    def __init__(self, distribution, name=None):
+        self.distribution = distribution
+        self.name = name
+
+    def __repr__(self):
+        return f"State({self.name!r})"
+
+
+class HiddenMarkovModel():
+    """
+    Hidden Markov model over a finite set of states emitting symbols from
+    a finite set.
+
+    After bake, the model is held in log space as arrays over state
+    indices: log_starts[s], log_transitions[s, t] for moving from state s
+    to state t and log_emissions[s, k] for state s emitting symbol k,
+    symbols[k].
+
+    Every inference method takes a batch of sequences of any lengths.
+    They are padded to the longest into an array of symbol indices with a
+    mask of real observations, indexed by step first, and each time step
+    updates the whole batch at once, so the Python loop runs once per time
+    step, not per sequence.
+    """
+
+    def __init__(self, name=None):
+        self.name = name
+        self.states = []
+        self.baked = False
+
+    @classmethod
+    def from_matrix(cls, transitions, distributions, starts,
+                    state_names=None, name=None):
+        """
+        Returns a model with a state for each of `distributions`, named by
+        `state_names`, moving between them as in the matrix `transitions`
+        and starting in each with the probability in `starts`.
+        """
+        model = cls(name)
+        if state_names is None:
+            state_names = [f"s{i}" for i in range(len(distributions))]
+        model.states = [State(distribution, name) for distribution, name
+                        in zip(distributions, state_names)]
+        model.transitions = np.asarray(transitions, dtype=float)
+        model.starts = np.asarray(starts, dtype=float)
+        return model
+
+    def bake(self):
+        """Compiles the model into log-space arrays."""
+        n_states = len(self.states)
+        if self.transitions.shape != (n_states, n_states) \
+                or self.starts.shape != (n_states,):
+            raise ValueError("transitions and starts must match the states")
+
+        self.symbols = list(dict.fromkeys(
+            symbol for state in self.states
+            for symbol in state.distribution.keys()
+        ))
+        self.symbol_index = {symbol: k
+                             for k, symbol in enumerate(self.symbols)}
+        emissions = np.array([
+            [state.distribution.probability(symbol) for symbol in self.symbols]
+            for state in self.states
+        ])
+        with np.errstate(divide="ignore"):
+            self.log_starts = np.log(self.starts)
+            self.log_transitions = np.log(self.transitions)
+            self.log_emissions = np.log(emissions)
+
+        # Log emission probabilities by symbol, for gathering a row per
+        # observation
+        self.emissions = np.ascontiguousarray(self.log_emissions.T)
+        self.baked = True
+
+    def check_baked(self):
+        if not self.baked:
+            raise Exception("model must be baked first")
+
+    def encode(self, sequences):
+        """
+        Returns (observations, mask) for a list of sequences of symbols,
+        indexed by step and then by sequence: observations[t, b] is the
+        index of symbol t of sequence b, or 0 past its end, and mask[t, b]
+        whether sequence b has a symbol t.
+        """
+        self.check_baked()
+        length = max(map(len, sequences), default=0)
+        observations = np.zeros((length, len(sequences)), dtype=np.int64)
+        mask = np.zeros((length, len(sequences)), dtype=bool)
+        for b, sequence in enumerate(sequences):
+            try:
+                observations[:len(sequence), b] = [
+                    self.symbol_index[symbol] for symbol in sequence
+                ]
+            except KeyError as e:
+                raise ValueError(f"unknown symbol {e.args[0]!r}") from None
+            mask[:len(sequence), b] = True
+        return observations, mask
+
+    def forward(self, observations, mask):
+        """
+        Returns the log forward probabilities, alpha[t, b, s] being the
+        log probability of the first t + 1 symbols of sequence b and being
+        in state s after them. Past the end of a sequence alpha keeps its
+        last value, and for an empty sequence it is log_starts.
+
+        Each step sums over previous states as a product with the
+        transition matrix after shifting each row by its maximum, which is
+        as stable as a log-sum-exp and far cheaper.
+        """
+        length, batch = observations.shape
+        alpha = np.empty((length, batch, len(self.states)))
+        if not length:
+            return alpha
+        alpha[0] = np.where(mask[0, :, np.newaxis],
+                            self.log_starts + self.emissions[observations[0]],
+                            self.log_starts)
+        for t in range(1, length):
+            step = (log_matmul(alpha[t - 1], self.transitions)
+                    + self.emissions[observations[t]])
+            alpha[t] = np.where(mask[t, :, np.newaxis], step, alpha[t - 1])
+        return alpha
+
+    def backward(self, observations, mask):
+        """
+        Returns the log backward probabilities, beta[t, b, s] being the
+        log probability of the symbols of sequence b after symbol t given
+        state s at t. Past the end of a sequence, beta is 0.
+        """
+        length, batch = observations.shape
+        beta = np.zeros((length, batch, len(self.states)))
+        for t in range(length - 2, -1, -1):
+            step = log_matmul(self.emissions[observations[t + 1]]
+                              + beta[t + 1], self.transitions.T)
+            beta[t] = np.where(mask[t + 1, :, np.newaxis], step, 0)
+        return beta
+
+    def log_probability_batch(self, sequences):
+        """Returns an array of the log probability of each sequence."""
+        observations, mask = self.encode(sequences)
+        if not len(observations):
+            return np.zeros(len(sequences))
+        return logsumexp(self.forward(observations, mask)[-1], axis=1)
+
+    def predict_proba_batch(self, sequences):
+        """
+        Returns a list with, for each sequence, an array whose row t is
+        the posterior distribution over states at step t given the whole
+        sequence, by the forward-backward algorithm.
+        """
+        observations, mask = self.encode(sequences)
+        if not len(observations):
+            return [np.zeros((0, len(self.states))) for _ in sequences]
+        alpha = self.forward(observations, mask)
+        beta = self.backward(observations, mask)
+        log_likelihood = logsumexp(alpha[-1], axis=1)
+        posteriors = np.exp(alpha + beta - log_likelihood[:, np.newaxis])
+        return [posteriors[:len(sequence), b]
+                for b, sequence in enumerate(sequences)]
+
+    def viterbi_batch(self, sequences):
+        """
+        Returns (log_probabilities, paths): for each sequence, the log
+        probability of its most likely path of states together with the
+        sequence, and that path as a list of state indices.
+        """
+        observations, mask = self.encode(sequences)
+        length, batch = observations.shape
+        if not length:
+            return np.zeros(batch), [[] for _ in sequences]
+
+        # Best log probability of a path ending in each state, and the
+        # previous state on that path; past a sequence's end each state
+        # points to itself
+        delta = np.where(mask[0, :, np.newaxis],
+                         self.log_starts + self.emissions[observations[0]],
+                         0)
+        pointers = np.empty((length, batch, len(self.states)), dtype=np.int64)
+        stay = np.arange(len(self.states))
+        for t in range(1, length):
+            scores = delta[:, :, np.newaxis] + self.log_transitions
+            best = scores.argmax(axis=1)
+            step = scores.max(axis=1) + self.emissions[observations[t]]
+            delta = np.where(mask[t, :, np.newaxis], step, delta)
+            pointers[t] = np.where(mask[t, :, np.newaxis], best, stay)
+
+        # Follow the pointers back from the best final state
+        states = np.empty((length, batch), dtype=np.int64)
+        states[-1] = delta.argmax(axis=1)
+        sequence_index = np.arange(batch)
+        for t in range(length - 1, 0, -1):
+            states[t - 1] = pointers[t, sequence_index, states[t]]
+        return delta.max(axis=1), [states[:len(sequence), b].tolist()
+                                   for b, sequence in enumerate(sequences)]
+
+    def log_probability(self, sequence):
+        """Returns the log probability of a sequence."""
+        return float(self.log_probability_batch([sequence])[0])
+
+    def predict_proba(self, sequence):
+        """
+        Returns an array whose row t is the posterior distribution over
+        states at step t of a sequence.
+        """
+        return self.predict_proba_batch([sequence])[0]
+
+    def viterbi(self, sequence):
+        """
+        Returns (log_probability, path) for the most likely path of states
+        through a sequence, path being a list of (index, state) pairs.
+        """
+        log_probabilities, paths = self.viterbi_batch([sequence])
+        return (float(log_probabilities[0]),
+                [(i, self.states[i]) for i in paths[0]])
+
+    def predict(self, sequence, algorithm="map"):
+        """
+        Returns the list of the indices of the most likely state at each
+        step of a sequence: each step's most probable state for "map", or
+        the most likely path of states for "viterbi".
+        """
+        if algorithm == "viterbi":
+            return self.viterbi_batch([sequence])[1][0]
+        return self.predict_proba(sequence).argmax(axis=1).tolist()
+
+
+class OnlineFilter():
+    """
+    Forward filter over an unbounded stream of observations.
+
+    Keeps only the distribution over states given everything seen so far,
+    normalized after each observation, and the log probability of the
+    stream so far, so memory and time per observation do not grow with
+    the length of the stream.
+    """
+
+    def __init__(self, model):
+        model.check_baked()
+        self.model = model
+        self.transitions = model.transitions
+        self.emissions = np.exp(model.emissions)
+        self.reset()
+
+    def reset(self):
+        """Starts a new stream."""
+        self.belief = None
+        self.log_likelihood = 0.0
+        self.steps = 0
+
+    def predict(self):
+        """
+        Returns the distribution over states at the next step, given the
+        observations so far.
+        """
+        if self.belief is None:
+            return self.model.starts / self.model.starts.sum()
+        return self.belief @ self.transitions
+
+    def update(self, symbol):
+        """
+        Takes in the next observation and returns the distribution over
+        states at its step given the stream so far.
+        """
+        try:
+            emission = self.emissions[self.model.symbol_index[symbol]]
+        except KeyError:
+            raise ValueError(f"unknown symbol {symbol!r}") from None
+        belief = self.predict() * emission
+        total = belief.sum()
+        if total == 0:
+            raise ValueError(f"observation {symbol!r} is impossible here")
+        self.belief = belief / total
+        self.log_likelihood += np.log(total)
+        self.steps += 1
+        return self.belief
+
+    def update_many(self, symbols):
+        """
+        Takes in a chunk of observations and returns an array of the
+        filtered distribution at each of their steps.
+        """
+        return np.array([self.update(symbol) for symbol in symbols]).reshape(
+            -1, len(self.model.states)
+        )
+
+
+class FixedLagSmoother():
+    """
+    Fixed-lag smoother over an unbounded stream of observations.
+
+    Once `lag` observations have followed a step, its distribution over
+    states is emitted given everything up to then. The filtered
+    distributions and observations of the last `lag` + 1 steps are kept in
+    a bounded buffer, and each observation runs `lag` backward steps over
+    it, so memory and latency stay constant however long the stream.
+    """
+
+    def __init__(self, model, lag):
+        if lag < 0:
+            raise ValueError("lag must not be negative")
+        self.filter = OnlineFilter(model)
+        self.lag = lag
+        self.reset()
+
+    def reset(self):
+        """Starts a new stream."""
+        self.filter.reset()
+        self.beliefs = collections.deque(maxlen=self.lag + 1)
+        self.observations = collections.deque(maxlen=self.lag + 1)
+
+    def smoothed(self, start):
+        """
+        Returns the distribution over states at buffered step `start`
+        given every buffered observation after it.
+        """
+        backward = np.ones(len(self.filter.model.states))
+        for k in range(len(self.observations) - 1, start, -1):
+            backward = self.filter.transitions @ (
+                self.filter.emissions[self.observations[k]] * backward
+            )
+            backward /= backward.sum()
+        smoothed = self.beliefs[start] * backward
+        return smoothed / smoothed.sum()
+
+    def update(self, symbol):
+        """
+        Takes in the next observation and returns the smoothed
+        distribution over states `lag` steps back, or None while fewer
+        than `lag` + 1 observations have been seen.
+        """
+        self.beliefs.append(self.filter.update(symbol))
+        self.observations.append(self.filter.model.symbol_index[symbol])
+        if len(self.beliefs) <= self.lag:
+            return None
+        return self.smoothed(0)
+
+    def update_many(self, symbols):
+        """
+        Takes in a chunk of observations and returns an array of the
+        smoothed distributions emitted for them.
+        """
+        emitted = [self.update(symbol) for symbol in symbols]
+        return np.array([smoothed for smoothed in emitted
+                         if smoothed is not None]).reshape(
+            -1, len(self.filter.model.states)
+        )
+
+    def flush(self):
+        """
+        Returns an array of the smoothed distributions of the steps still
+        waiting for `lag` later observations, given the whole stream, and
+        starts a new stream.
+        """
+        start = 1 if len(self.beliefs) > self.lag else 0
+        remaining = [self.smoothed(k)
+                     for k in range(start, len(self.beliefs))]
+        self.reset()
+        return np.array(remaining).reshape(-1, len(self.filter.model.states))
+
+
+def log_matmul(log_x, matrix):
+    """
+    Returns the log of the product of exp(log_x) and `matrix`, shifting
+    each row of log_x by its maximum before exponentiating.
+    """
+    shift = log_x.max(axis=-1, keepdims=True)
+    shift = np.where(np.isfinite(shift), shift, 0)
+    with np.errstate(divide="ignore"):
+        return np.log(np.exp(log_x - shift) @ matrix) + shift
+
+
+def logsumexp(x, axis):
+    """
+    Returns the log of the sum of the exponentials of `x` along `axis`,
+    shifting by the maximum so that the sum neither overflows nor
+    underflows.
+    """
+    shift = np.max(x, axis=axis, keepdims=True)
+    shift = np.where(np.isfinite(shift), shift, 0)
+    with np.errstate(divide="ignore"):
+        total = np.log(np.sum(np.exp(x - shift), axis=axis))
+    return total + np.squeeze(shift, axis=axis)
@@ -1,4 +1,6 @@
-from pomegranate import *
+import numpy
+
+from hmm import *
 
 # Observation model for each state
 sun = DiscreteDistribution({
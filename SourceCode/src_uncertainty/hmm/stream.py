@@ -0,0 +1,32 @@
+import sys
+
+from hmm import FixedLagSmoother, OnlineFilter
+from model import model
+
+# Observations the smoother waits for before settling on a step's state
+LAG = 3
+
+
+def describe(distribution):
+    return ", ".join(f"{state.name} {p:.4f}"
+                     for state, p in zip(model.states, distribution))
+
+
+# Read one observation per line from standard input, printing the filtered
+# belief straight away and the smoothed belief LAG observations later
+online = OnlineFilter(model)
+smoother = FixedLagSmoother(model, LAG)
+step = 0
+for line in sys.stdin:
+    observation = line.strip()
+    if not observation:
+        continue
+    print(f"{step} filtered: {describe(online.update(observation))}")
+    smoothed = smoother.update(observation)
+    if smoothed is not None:
+        print(f"{step - LAG} smoothed: {describe(smoothed)}")
+    step += 1
+
+# Settle the last steps once the stream ends
+for k, smoothed in enumerate(smoother.flush(), start=max(0, step - LAG)):
+    print(f"{k} smoothed: {describe(smoothed)}")